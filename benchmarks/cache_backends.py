@@ -0,0 +1,117 @@
+"""Сравнение кеш-бэкендов: LocMemCache, FileBasedCache и SQLiteCache.
+
+Запуск из корня репозитория:
+
+    python benchmarks/cache_backends.py --operations 20000 --processes 4
+
+Для каждого бэкенда печатается число операций в секунду для set, get,
+get_many, set_many и incr. С --processes > 1 операции get/set
+выполняются параллельно несколькими процессами над одним и тем же
+хранилищем, как в нескольких WSGI-воркерах (у LocMemCache каждый
+процесс при этом видит только свой кеш).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache.backends.filebased import FileBasedCache  # noqa: E402
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+from core.cache import SQLiteCache  # noqa: E402
+
+PARAMS = {'TIMEOUT': 600, 'OPTIONS': {'MAX_ENTRIES': 1000000}}
+VALUE = {'html': '<article>' + 'x' * 2000 + '</article>', 'n': 42}
+
+
+def make_backends(directory):
+    return {
+        'locmem': lambda: LocMemCache('bench', PARAMS),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), PARAMS),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), PARAMS),
+    }
+
+
+def timed(operations, function):
+    started = time.perf_counter()
+    function()
+    return operations / (time.perf_counter() - started)
+
+
+def run_single(cache, operations):
+    keys = [f'key-{i}' for i in range(operations)]
+    results = {
+        'set': timed(operations, lambda: [
+            cache.set(key, VALUE) for key in keys]),
+        'get': timed(operations, lambda: [cache.get(key) for key in keys]),
+    }
+    batches = [keys[i:i + 10] for i in range(0, operations, 10)]
+    results['get_many'] = timed(operations, lambda: [
+        cache.get_many(batch) for batch in batches])
+    results['set_many'] = timed(operations, lambda: [
+        cache.set_many({key: VALUE for key in batch}) for batch in batches])
+    cache.set('counter', 0)
+    results['incr'] = timed(operations, lambda: [
+        cache.incr('counter') for _ in range(operations)])
+    return results
+
+
+def worker(factory_name, directory, operations, queue):
+    cache = make_backends(directory)[factory_name]()
+    keys = [f'shared-{i % 1000}' for i in range(operations)]
+    started = time.perf_counter()
+    for key in keys:
+        if cache.get(key) is None:
+            cache.set(key, VALUE)
+    queue.put(operations / (time.perf_counter() - started))
+
+
+def run_parallel(name, directory, operations, processes):
+    queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=worker, args=(name, directory, operations, queue))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    return sum(queue.get() for _ in workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operations', type=int, default=10000)
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        backends = make_backends(directory)
+        columns = ('set', 'get', 'get_many', 'set_many', 'incr')
+        print('backend'.ljust(10) + ''.join(c.rjust(12) for c in columns))
+        for name, factory in backends.items():
+            results = run_single(factory(), args.operations)
+            print(name.ljust(10) + ''.join(
+                f'{results[column]:12.0f}' for column in columns))
+        if args.processes > 1:
+            print(f'\nget-or-set, {args.processes} процесса, операций/с:')
+            for name in backends:
+                total = run_parallel(
+                    name, directory, args.operations, args.processes)
+                print(f'{name.ljust(10)}{total:12.0f}')
+
+
+if __name__ == '__main__':
+    main()
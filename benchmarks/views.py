@@ -0,0 +1,285 @@
+"""Задержка, число запросов к базе и пиковая память каждой страницы.
+
+Запуск из корня репозитория:
+
+    python benchmarks/views.py --sizes 1000,100000,1000000 \\
+        --output report.json --baseline benchmarks/baseline.json
+
+Для каждого размера базы (числа постов) данные один раз генерируются
+командой generate_data в отдельный файл SQLite в --data-dir и затем
+переиспользуются. Каждый URL из posts.urls, users.urls и about.urls
+запрашивается тестовым клиентом от имени авторизованного пользователя:
+время считается по --requests запросам (p50 и p99), число запросов к
+базе и пик памяти Python (tracemalloc) — по одному отдельному запросу.
+Каждый запрос выполняется в транзакции, которая затем откатывается:
+страницы вроде profile_follow не меняют базу, и каждый запрос и каждый
+запуск видят одни и те же данные.
+
+Страницы рендерятся с DEBUG = False, как в продакшене (без
+debug_toolbar и с кешированным загрузчиком шаблонов). Фрагментный кеш
+по умолчанию выключен (DummyCache), чтобы измерять
+полную стоимость страницы; --warm-cache включает LocMemCache.
+
+Отчёт пишется в JSON. С --baseline отчёт сравнивается с прошлым:
+скрипт завершается с кодом 1, если у какой-то страницы выросло число
+запросов к базе или p50 стал больше чем в --threshold раз медленнее.
+В конце печатается, во сколько раз p50 на самой большой базе больше,
+чем на самой маленькой: у страниц, которые читают всю выборку целиком,
+этот рост пропорционален числу постов.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.tokens import default_token_generator  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, connections, transaction  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import URLPattern, reverse  # noqa: E402
+from django.utils.encoding import force_bytes  # noqa: E402
+from django.utils.http import urlsafe_base64_encode  # noqa: E402
+
+from about import urls as about_urls  # noqa: E402
+from posts import urls as posts_urls  # noqa: E402
+from posts.models import Group, Post  # noqa: E402
+from users import urls as users_urls  # noqa: E402
+
+User = get_user_model()
+
+URLCONFS = (posts_urls, users_urls, about_urls)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+BENCH_USERNAME = 'benchmark'
+SEED = 1
+SETTINGS = {
+    'DEBUG': False,
+    'ALLOWED_HOSTS': ['testserver'],
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+}
+CACHES = {
+    'cold': {'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'warm': {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+}
+
+
+def use_database(path):
+    connections.close_all()
+    connection.settings_dict['NAME'] = path
+
+
+def prepare_database(size, data_dir):
+    """Создаёт базу с size постами, если её ещё нет, и подключается к ней."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'posts-{size}.sqlite3')
+    ready = os.path.exists(path)
+    use_database(path)
+    if ready:
+        return
+    print(f'Генерация базы на {size} постов...', file=sys.stderr)
+    call_command('migrate', verbosity=0)
+    users = max(size // 100, 20)
+    call_command(
+        'generate_data',
+        users=users, groups=max(size // 1000, 5), posts=size,
+        comments=size, follows=users * 2, seed=SEED,
+        skip_timelines=True, stdout=io.StringIO(),
+    )
+    # Ленту подписок заполняют сигналы, поэтому полные ленты всех
+    # пользователей не нужны: хватает ленты самого пользователя бенчмарка.
+    user = User.objects.create_user(BENCH_USERNAME)
+    authors = User.objects.annotate(
+        posts_total=Count('posts')).order_by('-posts_total')[:20]
+    for author in authors:
+        user.follower.create(author=author)
+    group = Group.objects.order_by('pk').first()
+    for number in range(3):
+        Post.objects.create(
+            author=user, group=group, text=f'Пост бенчмарка {number}')
+
+
+def url_kwargs(user):
+    """Значения параметров URL: самые «тяжёлые» объекты в базе."""
+    top_author = User.objects.annotate(
+        posts_total=Count('posts')).order_by('-posts_total').first()
+    return {
+        'slug': Post.objects.exclude(group=None).latest('pub_date').group.slug,
+        'username': top_author.username,
+        'post_id': user.posts.order_by('-pk').values_list(
+            'pk', flat=True).first(),
+        'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+
+
+def iter_urls(kwargs):
+    for urlconf in URLCONFS:
+        for pattern in urlconf.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            name = f'{urlconf.app_name}:{pattern.name}'
+            params = {
+                key: kwargs[key] for key in pattern.pattern.converters}
+            yield name, reverse(name, kwargs=params)
+
+
+@contextmanager
+def rolled_back():
+    """Откатывает всё, что записали в базу запросы внутри блока."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(client, url, requests):
+    session = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def get(context=nullcontext()):
+        with rolled_back(), context:
+            response = client.get(url)
+        # Откат возвращает в базу сессию, удалённую logout, а cookie
+        # клиента нужно вернуть самим.
+        client.cookies[settings.SESSION_COOKIE_NAME] = session
+        return response
+
+    status = get().status_code
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        get()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    queries = CaptureQueriesContext(connection)
+    get(queries)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        'url': url,
+        'status': status,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(
+            timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_size(size, args):
+    prepare_database(size, args.data_dir)
+    user = User.objects.get(username=BENCH_USERNAME)
+    client = Client()
+    results = {}
+    # Откатывается и вход пользователя бенчмарка (сессия, last_login).
+    with rolled_back():
+        client.force_login(user)
+        for name, url in iter_urls(url_kwargs(user)):
+            results[name] = measure(client, url, args.requests)
+            row = results[name]
+            print(
+                f'{size:>9} {name:<32} {row["status"]:>4} '
+                f'{row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f} '
+                f'{row["queries"]:>6} {row["peak_kb"]:>10.1f}'
+            )
+    return results
+
+
+def compare(report, baseline, threshold):
+    """Возвращает список регрессий относительно baseline."""
+    regressions = []
+    for size, views in report['results'].items():
+        for name, row in views.items():
+            old = baseline.get('results', {}).get(size, {}).get(name)
+            if old is None:
+                continue
+            if row['queries'] > old['queries']:
+                regressions.append(
+                    f'{size} {name}: запросов к базе '
+                    f'{old["queries"]} -> {row["queries"]}')
+            if row['p50_ms'] > old['p50_ms'] * threshold:
+                regressions.append(
+                    f'{size} {name}: p50 '
+                    f'{old["p50_ms"]:.2f} -> {row["p50_ms"]:.2f} мс')
+    return regressions
+
+
+def print_scaling(report):
+    sizes = sorted(report['results'], key=int)
+    if len(sizes) < 2:
+        return
+    smallest, largest = report['results'][sizes[0]], report[
+        'results'][sizes[-1]]
+    print(f'\nРост p50 с {sizes[0]} до {sizes[-1]} постов:')
+    for name, row in largest.items():
+        if name in smallest and smallest[name]['p50_ms']:
+            ratio = row['p50_ms'] / smallest[name]['p50_ms']
+            print(f'{name:<32} {ratio:>8.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes', default='1000,100000,1000000',
+        help='Размеры базы в постах через запятую.',
+    )
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--warm-cache', action='store_true')
+    parser.add_argument('--output', default='benchmark-views.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type=float, default=1.5)
+    args = parser.parse_args()
+
+    # Ответы вроде 404 у страниц без подходящих данных ожидаемы.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    caches = CACHES['warm' if args.warm_cache else 'cold']
+    report = {
+        'meta': {
+            'requests': args.requests,
+            'cache': 'warm' if args.warm_cache else 'cold',
+            'django': django.get_version(),
+            'python': sys.version.split()[0],
+        },
+        'results': {},
+    }
+    print(
+        f'{"posts":>9} {"view":<32} {"code":>4} {"p50, мс":>9} '
+        f'{"p99, мс":>9} {"SQL":>6} {"пик, КБ":>10}'
+    )
+    with override_settings(CACHES=caches, **SETTINGS):
+        for size in (int(size) for size in args.sizes.split(',')):
+            report['results'][str(size)] = run_size(size, args)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print_scaling(report)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        if regressions:
+            print('\nРегрессии относительно baseline:')
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print('\nРегрессий относительно baseline нет.')
+
+
+if __name__ == '__main__':
+    main()
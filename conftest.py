@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_environment():
+    """Временные кеш и метрики и строгие бюджеты SQL-запросов, как
+    у manage.py test (core.test_runner)."""
+    from django.test import override_settings
+
+    from core.test_runner import isolated_environment
+
+    with isolated_environment(), override_settings(QUERY_BUDGET_STRICT=True):
+        yield
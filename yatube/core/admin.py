@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'created', 'view', 'duration', 'call_site', 'template')
+    list_filter = ('view',)
+    search_fields = ('sql', 'call_site', 'template')
+    readonly_fields = (
+        'created', 'view', 'duration', 'sql', 'params', 'call_site',
+        'template')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,266 @@
+"""Кеш в файле SQLite в режиме WAL, общий для всех процессов на хосте."""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import record_cache_lookup
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_size ('
+    ' id INTEGER PRIMARY KEY,'
+    ' n INTEGER'
+    ')',
+    'INSERT OR IGNORE INTO cache_size (id, n) VALUES (1, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache '
+    'BEGIN UPDATE cache_size SET n = n + 1 WHERE id = 1; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache '
+    'BEGIN UPDATE cache_size SET n = n - 1 WHERE id = 1; END',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+# SQLite до 3.32 ограничивает запрос 999 параметрами.
+BATCH_SIZE = 900
+
+
+class SQLiteCache(BaseCache):
+    """Кеш-бэкенд поверх одного файла SQLite.
+
+    Все процессы, открывшие один LOCATION, видят одни и те же данные,
+    поэтому сброс кеша в одном воркере виден остальным. Поддерживаются
+    TTL, вытеснение давно не читанных записей при превышении
+    MAX_ENTRIES и атомарный incr.
+
+    Время последнего чтения обновляется не чаще TOUCH_INTERVAL секунд,
+    чтобы чтения не превращались в запись на каждый запрос.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 1))
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with _transaction(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_key(key, version=version): key for key in keys}
+        for key in key_map:
+            self.validate_key(key)
+        found = self._get_many(list(key_map))
+        return {key_map[key]: value for key, value in found.items()}
+
+    def _get_many(self, keys):
+        now = time.time()
+        connection = self._connection
+        found = {}
+        stale = []
+        for start in range(0, len(keys), BATCH_SIZE):
+            chunk = keys[start:start + BATCH_SIZE]
+            rows = connection.execute(
+                'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({_placeholders(chunk)}) AND {ALIVE}',
+                (*chunk, now),
+            ).fetchall()
+            for key, value, accessed in rows:
+                found[key] = _loads(value)
+                if now - accessed > self._touch_interval:
+                    stale.append(key)
+        record_cache_lookup(len(found), len(keys) - len(found))
+        if stale:
+            with _transaction(connection):
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale],
+                )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append((key, _dumps(value), expires, now))
+        connection = self._connection
+        with _transaction(connection):
+            connection.executemany(
+                'INSERT INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed',
+                rows,
+            )
+            self._cull(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        connection = self._connection
+        with _transaction(connection):
+            cursor = connection.execute(
+                'INSERT INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (key, _dumps(value), self.get_backend_timeout(timeout),
+                 now, now),
+            )
+            self._cull(connection, now)
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        with _transaction(connection):
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = _loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (_dumps(value), key),
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        with _transaction(connection):
+            cursor = connection.execute(
+                f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        connection = self._connection
+        with _transaction(connection):
+            for start in range(0, len(keys), BATCH_SIZE):
+                chunk = keys[start:start + BATCH_SIZE]
+                connection.execute(
+                    f'DELETE FROM cache WHERE key IN ({_placeholders(chunk)})',
+                    chunk,
+                )
+
+    def clear(self):
+        connection = self._connection
+        with _transaction(connection):
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами своего процесса.
+        pass
+
+    def _cull(self, connection, now):
+        size = connection.execute(
+            'SELECT n FROM cache_size WHERE id = 1').fetchone()[0]
+        if size <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        size = connection.execute(
+            'SELECT n FROM cache_size WHERE id = 1').fetchone()[0]
+        if size <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(size // self._cull_frequency, size - self._max_entries),),
+        )
+
+
+class _transaction:
+    """BEGIN IMMEDIATE сразу берёт блокировку записи на весь файл."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def _dumps(value):
+    # Целые числа хранятся как есть, чтобы incr не распаковывал pickle.
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
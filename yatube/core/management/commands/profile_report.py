@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+CATEGORIES = (
+    ('Шаблоны', ('django/template/', 'templatetags/')),
+    ('ORM', ('django/db/',)),
+    ('sorl.thumbnail', ('sorl/thumbnail/',)),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Объединяет профили запросов по страницам и печатает функции '
+        'с наибольшим накопленным временем: всего, в шаблонах, ORM и '
+        'sorl.thumbnail.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory', default=settings.PROFILER_DIRECTORY)
+        parser.add_argument(
+            '--view', help='Только эта страница, например posts:index.')
+        parser.add_argument('--limit', type=int, default=15)
+        parser.add_argument(
+            '--token', action='store_true',
+            help='Напечатать токен для заголовка X-Profile и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(profiling.make_token())
+            return
+        by_view = defaultdict(list)
+        for path, view, _ in profiling.list_profiles(options['directory']):
+            if options['view'] in (None, view):
+                by_view[view].append(path)
+        if not by_view:
+            self.stdout.write('Профилей нет.')
+            return
+        for view, paths in sorted(by_view.items()):
+            stats, broken = profiling.load_stats(paths)
+            for path in broken:
+                self.stderr.write(f'Пропущен испорченный профиль {path}')
+            if stats is None:
+                continue
+            paths = [path for path in paths if path not in broken]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{view}: профилей {len(paths)}, '
+                f'{stats.total_tt / len(paths) * 1000:.1f} мс на запрос'
+            ))
+            rows = hotspots(stats)
+            self.write_rows('Всего', rows, len(paths), options['limit'])
+            for title, markers in CATEGORIES:
+                self.write_rows(title, [
+                    row for row in rows
+                    if any(marker in row[0][0] for marker in markers)
+                ], len(paths), options['limit'])
+
+    def write_rows(self, title, rows, requests, limit):
+        if not rows:
+            return
+        self.stdout.write(f'  {title}:')
+        self.stdout.write(
+            f'    {"cumtime, мс":>12} {"вызовов":>9}  функция')
+        for (filename, line, function), calls, cumulative in rows[:limit]:
+            self.stdout.write(
+                f'    {cumulative / requests * 1000:12.2f} '
+                f'{calls / requests:9.1f}  '
+                f'{function} ({_short_path(filename)}:{line})'
+            )
+
+
+def hotspots(stats):
+    """Функции по убыванию накопленного времени: (ключ, вызовы, время)."""
+    rows = [
+        (key, calls, cumulative)
+        for key, (_, calls, _, cumulative, _) in stats.stats.items()
+    ]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def _short_path(filename):
+    for marker in ('site-packages/', 'yatube/'):
+        if marker in filename:
+            return filename.rsplit(marker, 1)[1]
+    return filename
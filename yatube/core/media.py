@@ -0,0 +1,139 @@
+"""Раздача загруженных файлов из MEDIA_ROOT.
+
+Файл не читается в Python: FileResponse отдаёт серверу открытый файл
+(wsgi.file_wrapper, у gunicorn это os.sendfile), а при
+MEDIA_ACCEL_REDIRECT отправку целиком берёт на себя nginx по заголовку
+X-Accel-Redirect. Поддерживаются If-None-Match, If-Modified-Since и один
+диапазон Range. Имена из ContentAddressedStorage содержат хеш
+содержимого и кешируются навсегда (immutable).
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import ContentAddressedStorage
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Ответы, которые описывают сам файл; 412 и 416 кешировать нельзя.
+CACHEABLE_STATUSES = {200, 206, 304}
+
+
+class FileRange:
+    """Кусок открытого файла для FileResponse.
+
+    read() не выходит за конец куска (так отдаёт Django без
+    wsgi.file_wrapper), а fileno() и позиция в файле позволяют серверу
+    отправить ровно Content-Length байт через sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+@require_safe
+def serve(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, posixpath.normpath(path))
+        stat_result = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+    size = stat_result.st_size
+    etag = f'"{stat_result.st_mtime_ns:x}-{size:x}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat_result.st_mtime))
+    if response is None:
+        response = _file_response(request, path, fullpath, size, etag,
+                                  int(stat_result.st_mtime))
+    if response.status_code not in CACHEABLE_STATUSES:
+        return response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat_result.st_mtime)
+    response['Cache-Control'] = (
+        IMMUTABLE if ContentAddressedStorage.is_hashed(path)
+        else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    )
+    return response
+
+
+def _file_response(request, path, fullpath, size, etag, last_modified):
+    content_type = (
+        mimetypes.guess_type(fullpath)[0] or 'application/octet-stream')
+    if settings.MEDIA_ACCEL_REDIRECT:
+        # nginx сам отвечает на Range и отдаёт файл через sendfile.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_REDIRECT + path)
+        return response
+    start, length = 0, size
+    byte_range = _requested_range(request, size, etag, last_modified)
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is not None:
+        start, length = byte_range
+    response = FileResponse(
+        FileRange(open(fullpath, 'rb'), start, length),
+        content_type=content_type,
+    )
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = (
+            f'bytes {start}-{start + length - 1}/{size}')
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _requested_range(request, size, etag, last_modified):
+    """(начало, длина) из заголовка Range, 'unsatisfiable' или None, если
+    отдавать нужно весь файл (в том числе при нескольких диапазонах)."""
+    match = RANGE.match(request.META.get('HTTP_RANGE', '').strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and (
+            parse_http_date_safe(if_range) != last_modified):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0:
+            return 'unsatisfiable'
+        length = min(int(last), size)
+        return size - length, length
+    first = int(first)
+    if first >= size:
+        return 'unsatisfiable'
+    last = min(int(last), size - 1) if last else size - 1
+    if last < first:
+        return None
+    return first, last - first + 1
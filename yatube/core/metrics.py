@@ -0,0 +1,189 @@
+"""Метрики страниц в формате Prometheus, общие для всех воркеров.
+
+Каждый процесс копит счётчики в памяти и раз в METRICS_FLUSH_INTERVAL
+секунд прибавляет накопленное к строкам файла SQLite METRICS_DATABASE.
+Все значения — монотонные счётчики (корзины гистограмм тоже), поэтому
+сложение приращений от разных воркеров даёт общую картину, а /metrics
+просто читает сумму.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (
+    1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+FAMILIES = {
+    'yatube_requests_total': (
+        'counter', 'Число запросов по страницам и кодам ответа.'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа страницы.'),
+    'yatube_response_size_bytes': (
+        'histogram', 'Размер тела ответа.'),
+    'yatube_db_queries_total': (
+        'counter', 'Число SQL-запросов.'),
+    'yatube_db_duration_seconds_total': (
+        'counter', 'Время в базе данных.'),
+    'yatube_cache_lookups_total': (
+        'counter', 'Чтения кеша с попаданием (hit) и промахом (miss).'),
+}
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS metrics ('
+    ' name TEXT NOT NULL,'
+    ' labels TEXT NOT NULL,'
+    ' value REAL NOT NULL,'
+    ' PRIMARY KEY (name, labels)'
+    ') WITHOUT ROWID'
+)
+
+current = threading.local()
+
+
+class Registry:
+    """Счётчики одного процесса с периодическим сбросом в общий файл."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._flushed = time.monotonic()
+        self._local = threading.local()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._add(name, labels, amount)
+
+    def observe(self, name, labels, value, buckets):
+        """Учитывает значение в гистограмме с корзинами buckets."""
+        with self._lock:
+            for le in buckets[bisect_left(buckets, value):]:
+                self._add(f'{name}_bucket', {**labels, 'le': str(le)}, 1)
+            self._add(f'{name}_bucket', {**labels, 'le': '+Inf'}, 1)
+            self._add(f'{name}_sum', labels, value)
+            self._add(f'{name}_count', labels, 1)
+
+    def _add(self, name, labels, amount):
+        key = (name, tuple(sorted(labels.items())))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            values, self._values = self._values, {}
+            self._flushed = time.monotonic()
+        if not values:
+            return
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (name, labels) DO UPDATE '
+                'SET value = value + excluded.value',
+                [
+                    (name, json.dumps(labels, ensure_ascii=False), value)
+                    for (name, labels), value in values.items()
+                ],
+            )
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def collect(self):
+        """Возвращает общие значения всех воркеров после своего сброса."""
+        self.flush()
+        rows = self._connection.execute(
+            'SELECT name, labels, value FROM metrics').fetchall()
+        return [
+            (name, [tuple(pair) for pair in json.loads(labels)], value)
+            for name, labels, value in rows
+        ]
+
+    @property
+    def _connection(self):
+        local = self._local
+        path = settings.METRICS_DATABASE
+        if (getattr(local, 'pid', None), getattr(local, 'path', None)) != (
+                os.getpid(), path):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(SCHEMA)
+            local.connection, local.pid, local.path = (
+                connection, os.getpid(), path)
+        return local.connection
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def record_cache_lookup(hits, misses):
+    """Учитывает чтение кеша в метриках текущей страницы."""
+    view = getattr(current, 'view', None)
+    if view is None:
+        return
+    if hits:
+        registry.inc(
+            'yatube_cache_lookups_total', {'view': view, 'result': 'hit'},
+            hits)
+    if misses:
+        registry.inc(
+            'yatube_cache_lookups_total', {'view': view, 'result': 'miss'},
+            misses)
+
+
+def render(samples):
+    """Текстовый формат Prometheus 0.0.4."""
+    def sort_key(sample):
+        name, labels, _ = sample
+        le = dict(labels).get('le')
+        return (
+            _family(name),
+            [pair for pair in labels if pair[0] != 'le'],
+            name,
+            float(le) if le is not None else 0,
+        )
+
+    lines = []
+    described = set()
+    for name, labels, value in sorted(samples, key=sort_key):
+        family = _family(name)
+        if family not in described:
+            kind, help_text = FAMILIES.get(family, ('untyped', ''))
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            described.add(family)
+        label_text = ','.join(
+            f'{key}="{_escape(str(label))}"' for key, label in labels)
+        value_text = repr(float(value)) if value % 1 else str(int(value))
+        lines.append(f'{name}{{{label_text}}} {value_text}')
+    return '\n'.join(lines) + '\n'
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
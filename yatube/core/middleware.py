@@ -0,0 +1,219 @@
+import cProfile
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from . import metrics, nplusone, profiling
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """execute_wrapper, который считает запросы и время в базе.
+
+    Запросы дольше slow_threshold миллисекунд запоминаются в slow вместе
+    с местом в коде и в шаблоне, откуда они пришли.
+    """
+
+    def __init__(self, slow_threshold=None):
+        self.count = 0
+        self.duration = 0.0
+        self.slow_threshold = slow_threshold
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.duration += elapsed
+            self.count += 1
+            if (self.slow_threshold is not None
+                    and elapsed * 1000 >= self.slow_threshold):
+                self.slow.append(_slow_query(sql, params, elapsed))
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и сверяет их с бюджетом.
+
+    Бюджеты задаются в settings.QUERY_BUDGETS по имени URL. При
+    QUERY_BUDGET_STRICT превышение бюджета — исключение (так работают
+    тесты), иначе — предупреждение в лог. Стоит в MIDDLEWARE сразу после
+    MetricsMiddleware, до остальных, чтобы учитывать и запросы сессий и
+    аутентификации.
+
+    Запросы медленнее SLOW_QUERY_THRESHOLD мс пишутся в лог и в
+    кольцевой журнал SlowQuery, который видно в админке.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter(settings.SLOW_QUERY_THRESHOLD)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        request.query_counter = counter
+        view_name = _view_name(request)
+        duration = counter.duration * 1000
+        if settings.QUERY_COUNT_HEADERS:
+            response['X-DB-Queries'] = str(counter.count)
+            response['X-DB-Time'] = f'{duration:.1f}'
+        logger.debug(
+            '%s %s: %d SQL-запросов, %.1f мс',
+            request.method, view_name, counter.count,
+            duration,
+        )
+        if counter.slow:
+            self.record_slow(view_name, counter.slow)
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and counter.count > budget:
+            message = (
+                f'{view_name}: {counter.count} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def record_slow(self, view_name, queries):
+        from .models import SlowQuery
+
+        for query in queries:
+            logger.warning(
+                'Медленный запрос %s, %.1f мс: %s [%s] %s',
+                view_name, query['duration'], query['sql'],
+                query['call_site'], query['template'],
+            )
+        try:
+            SlowQuery.record(view_name, queries)
+        except DatabaseError:
+            logger.exception('Не удалось сохранить медленные запросы')
+
+
+class MetricsMiddleware:
+    """Собирает метрики страниц для /metrics (см. core.metrics).
+
+    Стоит в MIDDLEWARE первым: время ответа включает все остальные
+    middleware, а запросы к базе берутся у QueryBudgetMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        metrics.current.view = None
+        try:
+            response = self.get_response(request)
+        finally:
+            view_name = _view_name(request)
+            metrics.current.view = None
+        labels = {'view': view_name}
+        registry = metrics.registry
+        registry.inc('yatube_requests_total', {
+            **labels, 'method': request.method,
+            'status': str(response.status_code),
+        })
+        registry.observe(
+            'yatube_request_duration_seconds', labels,
+            time.perf_counter() - started, metrics.LATENCY_BUCKETS,
+        )
+        if not response.streaming:
+            registry.observe(
+                'yatube_response_size_bytes', labels,
+                len(response.content), metrics.SIZE_BUCKETS,
+            )
+        counter = getattr(request, 'query_counter', None)
+        if counter is not None:
+            registry.inc('yatube_db_queries_total', labels, counter.count)
+            registry.inc(
+                'yatube_db_duration_seconds_total', labels, counter.duration)
+        registry.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.current.view = _view_name(request)
+
+
+class ProfilerMiddleware:
+    """Профилирует выборку запросов через cProfile (см. core.profiling)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(settings.PROFILER_HEADER)
+        requested = bool(token) and profiling.check_token(token)
+        rate = settings.PROFILER_SAMPLE_RATE
+        if not requested and not (rate and random.randrange(rate) == 0):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        name = profiling.dump(profiler, _view_name(request))
+        if requested:
+            response['X-Profile'] = name
+        return response
+
+
+class NPlusOneMiddleware:
+    """Выдаёт предупреждения о N+1 в шаблонах (см. core.nplusone)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            nplusone.flush_warnings()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+def _slow_query(sql, params, elapsed):
+    """Описание медленного запроса с ближайшими к нему местами в коде
+    проекта и в шаблоне."""
+    call_site = template = ''
+    frame = sys._getframe(1)
+    while frame is not None and not (call_site and template):
+        code = frame.f_code
+        filename = code.co_filename
+        if (not template and code.co_name == 'render_annotated'
+                and os.path.join('django', 'template') in filename):
+            template = nplusone.template_site(frame.f_locals.get('self'))
+        elif (not call_site and filename.startswith(settings.BASE_DIR)
+                and filename != __file__):
+            call_site = (
+                f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno} в {code.co_name}'
+            )
+        frame = frame.f_back
+    return {
+        'sql': sql,
+        'params': repr(params)[:1000],
+        'duration': elapsed * 1000,
+        'call_site': call_site[:500],
+        'template': template[:500],
+    }
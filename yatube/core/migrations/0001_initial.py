@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+                ('view', models.CharField(max_length=200, verbose_name='Страница')),
+                ('duration', models.FloatField(verbose_name='Время, мс')),
+                ('sql', models.TextField(verbose_name='SQL')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры')),
+                ('call_site', models.CharField(blank=True, max_length=500, verbose_name='Место в коде')),
+                ('template', models.CharField(blank=True, max_length=500, verbose_name='Место в шаблоне')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-id',),
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    created = models.DateTimeField(
+        'Дата',
+        auto_now_add=True,
+        db_index=True,
+    )
+    view = models.CharField(
+        'Страница',
+        max_length=200,
+    )
+    duration = models.FloatField(
+        'Время, мс',
+    )
+    sql = models.TextField(
+        'SQL',
+    )
+    params = models.TextField(
+        'Параметры',
+        blank=True,
+    )
+    call_site = models.CharField(
+        'Место в коде',
+        max_length=500,
+        blank=True,
+    )
+    template = models.CharField(
+        'Место в шаблоне',
+        max_length=500,
+        blank=True,
+    )
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return f'{self.view}: {self.duration:.1f} мс'
+
+    @classmethod
+    def record(cls, view, queries):
+        """Сохраняет медленные запросы, оставляя последние
+        SLOW_QUERY_LOG_SIZE записей."""
+        cls.objects.bulk_create(cls(view=view, **query) for query in queries)
+        last_id = cls.objects.order_by('-pk').values_list(
+            'pk', flat=True).first()
+        cls.objects.filter(
+            pk__lte=last_id - settings.SLOW_QUERY_LOG_SIZE).delete()
+
+
+class StoredFile(models.Model):
+    """Число ссылок на файл в core.storage.ContentAddressedStorage."""
+    name = models.CharField(
+        'Файл',
+        max_length=255,
+        unique=True,
+    )
+    refs = models.PositiveIntegerField(
+        'Ссылок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.refs}'
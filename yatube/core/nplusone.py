@@ -0,0 +1,128 @@
+"""Поиск N+1: ленивая загрузка связей внутри {% for %} в шаблонах.
+
+Следит за внешними ключами моделей из settings.NPLUSONE_MODELS в обе
+стороны: post.author (прямая связь) и post.comments.all() (обратная).
+Если такая связь загружается запросом к базе внутри цикла шаблона, то
+при NPLUSONE_MODE = 'raise' поднимается LazyLoadError, а при 'warn'
+NPlusOneMiddleware по окончании запроса выдаёт по одному
+LazyLoadWarning на каждую строку шаблона с числом повторов.
+"""
+import sys
+import threading
+import warnings
+from collections import Counter
+
+from django.conf import settings
+from django.db.models.fields import related_descriptors
+from django.template.defaulttags import ForNode
+
+_local = threading.local()
+_installed = False
+
+
+class LazyLoadError(Exception):
+    pass
+
+
+class LazyLoadWarning(UserWarning):
+    pass
+
+
+def install():
+    """Подменяет загрузку связей Django; вызывается из CoreConfig.ready()."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    descriptor = related_descriptors.ForwardManyToOneDescriptor
+    get_object = descriptor.get_object
+
+    def watched_get_object(self, instance):
+        _check(self.field, instance)
+        return get_object(self, instance)
+
+    descriptor.get_object = watched_get_object
+
+    create_manager = related_descriptors.create_reverse_many_to_one_manager
+
+    def watched_create_manager(superclass, rel):
+        manager_class = create_manager(superclass, rel)
+
+        class WatchedRelatedManager(manager_class):
+            def get_queryset(self):
+                cache = getattr(self.instance, '_prefetched_objects_cache', {})
+                if self.field.remote_field.get_cache_name() not in cache:
+                    _check(self.field, self.instance, reverse=True)
+                return super().get_queryset()
+
+        return WatchedRelatedManager
+
+    related_descriptors.create_reverse_many_to_one_manager = (
+        watched_create_manager)
+
+
+def _check(field, instance, reverse=False):
+    mode = settings.NPLUSONE_MODE
+    if not mode or field.model._meta.label not in settings.NPLUSONE_MODELS:
+        return
+    template = _loop_template_site()
+    if template is None:
+        return
+    if reverse:
+        accessor = field.remote_field.get_accessor_name()
+        relation = f'{type(instance).__name__}.{accessor}'
+    else:
+        relation = f'{field.model.__name__}.{field.name}'
+    if mode == 'raise':
+        raise LazyLoadError(
+            f'{template}: {relation} загружается в цикле отдельным '
+            f'запросом, добавьте select_related/prefetch_related'
+        )
+    reports = getattr(_local, 'reports', None)
+    if reports is None:
+        reports = _local.reports = Counter()
+    reports[(template, relation)] += 1
+
+
+def _loop_template_site():
+    """Место в шаблоне, если загрузка идёт внутри {% for %}.
+
+    prefetch_related сам раскладывает загруженные объекты через менеджеры
+    связей, это не ленивая загрузка.
+    """
+    frame = sys._getframe(2)
+    site = None
+    while frame is not None:
+        code = frame.f_code
+        node = frame.f_locals.get('self')
+        if code.co_name == 'prefetch_one_level':
+            return None
+        if site is None and code.co_name == 'render_annotated':
+            site = template_site(node)
+        elif code.co_name == 'render' and isinstance(node, ForNode):
+            return site or template_site(node)
+        frame = frame.f_back
+    return None
+
+
+def template_site(node):
+    origin = getattr(node, 'origin', None)
+    token = getattr(node, 'token', None)
+    if origin is None or token is None:
+        return ''
+    name = origin.template_name or origin.name
+    return f'{name}:{token.lineno} {token.contents}'
+
+
+def flush_warnings():
+    """Выдаёт накопленные предупреждения, по одному на строку шаблона."""
+    reports = getattr(_local, 'reports', None)
+    if not reports:
+        return
+    _local.reports = None
+    for (template, relation), count in reports.items():
+        warnings.warn(
+            f'{template}: {relation} загружена лениво {count} раз(а) '
+            f'в цикле',
+            LazyLoadWarning,
+        )
@@ -0,0 +1,92 @@
+"""Выборочное профилирование запросов в продакшене.
+
+Профилируется каждый PROFILER_SAMPLE_RATE-й запрос в среднем, а также
+любой запрос с заголовком PROFILER_HEADER, в котором передан токен из
+make_token(). Профили cProfile складываются в PROFILER_DIRECTORY с
+именем страницы в названии файла; хранятся последние
+PROFILER_MAX_FILES файлов.
+"""
+import os
+import pstats
+import time
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'core.profiler'
+SUFFIX = '.prof'
+# Что бросает pstats на обрезанном, чужом или уже удалённом файле.
+BROKEN_PROFILE_ERRORS = (
+    OSError, EOFError, ValueError, TypeError, AttributeError)
+
+
+def make_token():
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def check_token(token):
+    try:
+        signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def dump(profiler, view_name):
+    """Сохраняет профиль и удаляет самые старые файлы сверх лимита."""
+    directory = settings.PROFILER_DIRECTORY
+    os.makedirs(directory, exist_ok=True)
+    name = (
+        f'{time.time():.6f}-{os.getpid()}-'
+        f'{view_name.replace(":", ".")}{SUFFIX}'
+    )
+    profiler.dump_stats(os.path.join(directory, name))
+    files = sorted(list_profiles(directory), key=lambda item: item[2])
+    for path, _, _ in files[:-settings.PROFILER_MAX_FILES]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def list_profiles(directory):
+    """Возвращает (путь, имя страницы, время записи) всех профилей."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith(SUFFIX):
+            continue
+        try:
+            created, _, view = name[:-len(SUFFIX)].split('-', 2)
+            created = float(created)
+        except ValueError:
+            continue
+        profiles.append((
+            os.path.join(directory, name),
+            view.replace('.', ':'),
+            created,
+        ))
+    return profiles
+
+
+def load_stats(paths):
+    """Объединяет профили в один pstats.Stats, пропуская испорченные.
+
+    Возвращает (Stats или None, если читать нечего, пропущенные пути).
+    """
+    stats = None
+    broken = []
+    for path in paths:
+        try:
+            profile = pstats.Stats(path)
+        except BROKEN_PROFILE_ERRORS:
+            broken.append(path)
+            continue
+        if stats is None:
+            stats = profile
+        else:
+            stats.add(profile)
+    return stats, broken
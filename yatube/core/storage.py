@@ -0,0 +1,92 @@
+"""Хранилище файлов с именами по содержимому.
+
+Файл сохраняется как <каталог upload_to>/ab/cd/<sha256><расширение>:
+одинаковые загрузки превращаются в один файл, а вложенные каталоги не
+дают одному каталогу разрастись до миллионов файлов. Модели, которые
+ссылаются на файл, вызывают retain и release; когда release снимает
+последнюю ссылку (StoredFile), вызывающий после фиксации транзакции
+удаляет файл через delete_released.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension)
+
+    @staticmethod
+    def is_hashed(name):
+        return HASHED_NAME.search(name) is not None
+
+    def retain(self, name):
+        """Добавляет ссылку на файл."""
+        from .models import StoredFile
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {StoredFile._meta.db_table} (name, refs) '
+                f'VALUES (%s, 1) ON CONFLICT (name) DO UPDATE '
+                f'SET refs = refs + 1',
+                [name],
+            )
+
+    def release(self, name):
+        """Снимает ссылку на файл; возвращает True, если ссылок не
+        осталось и файл пора удалить через delete_released.
+
+        Файлы, загруженные до этого хранилища, ссылок не считали: у них
+        всегда одна ссылка.
+        """
+        from .models import StoredFile
+
+        # Чаще всего ссылка последняя: тогда хватает одного DELETE.
+        last = StoredFile.objects.filter(name=name, refs__lte=1)
+        if last._raw_delete(last.db):
+            return True
+        return not StoredFile.objects.filter(name=name, refs__gt=1).update(
+            refs=F('refs') - 1)
+
+    def delete_released(self, name):
+        """Удаляет файл, освобождённый release, после фиксации транзакции;
+        возвращает True, если файл удалён."""
+        from .models import StoredFile
+
+        # Пока транзакция с release шла, тот же файл могли загрузить
+        # снова: save нашёл его на диске, и retain завёл новую ссылку.
+        if StoredFile.objects.filter(name=name).exists():
+            return False
+        try:
+            self.delete(name)
+        except (OSError, SuspiciousFileOperation):
+            logger.warning('Не удалось удалить файл %s', name, exc_info=True)
+            return False
+        return True
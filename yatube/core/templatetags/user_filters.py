@@ -6,3 +6,13 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor=None):
+    """Ссылка на страницу с курсором cursor и прочими GET-параметрами."""
+    query = context['request'].GET.copy()
+    query.pop('cursor', None)
+    if cursor:
+        query['cursor'] = cursor
+    return f'?{query.urlencode()}'
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from .metrics import registry
+
+
+@contextmanager
+def isolated_environment():
+    """Кеш и метрики тестов — во временном каталоге, а не в cache/
+    сайта: иначе cache.clear() в тестах стирал бы рабочий кеш, версии
+    лент переживали бы запуск тестов, а счётчики тестовых запросов
+    попадали бы в /metrics."""
+    directory = tempfile.mkdtemp(prefix='yatube-tests-')
+    caches = {
+        alias: {**config, 'LOCATION': os.path.join(
+            directory, f'{alias}.sqlite3')}
+        for alias, config in settings.CACHES.items()
+    }
+    try:
+        with override_settings(
+            CACHES=caches,
+            METRICS_DATABASE=os.path.join(directory, 'metrics.sqlite3'),
+        ):
+            try:
+                yield
+            finally:
+                # Иначе остаток сбросит atexit уже в файл сайта.
+                registry.flush()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Тесты падают, если страница превысила бюджет SQL-запросов."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+        self.isolation = ExitStack()
+        self.isolation.enter_context(isolated_environment())
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolation.close()
+        super().teardown_test_environment(**kwargs)
@@ -1,4 +1,25 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.http import http_date
+
+from posts.models import Comment, Post
+
+from . import media, metrics, nplusone, profiling
+from .cache import SQLiteCache
+from .middleware import QueryBudgetExceeded
+from .models import SlowQuery
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +28,429 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 10}})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_and_many(self):
+        """Значения сохраняются и читаются по одному и пачкой"""
+        self.cache.set('a', {'x': 1})
+        self.cache.set_many({'b': 2, 'c': [3]})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'missing']),
+            {'a': {'x': 1}, 'b': 2, 'c': [3]},
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('c'), [3])
+
+    def test_timeout_and_add(self):
+        """Просроченные записи не отдаются, add пишет поверх них"""
+        self.cache.set('key', 'old', timeout=0.1)
+        self.assertFalse(self.cache.add('key', 'new'))
+        time.sleep(0.2)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr работает и видим другим экземплярам бэкенда"""
+        other = SQLiteCache(self.location, {})
+        self.cache.set('counter', 1)
+        self.cache.incr('counter')
+        self.assertEqual(other.incr('counter', 10), 12)
+        self.assertEqual(self.cache.get('counter'), 12)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При превышении MAX_ENTRIES вытесняются давно не читанные"""
+        self.cache._touch_interval = 0
+        for i in range(10):
+            self.cache.set(f'key-{i}', i)
+        self.cache.get('key-0')
+        self.cache.set('key-10', 10)
+        self.assertEqual(self.cache.get('key-0'), 0)
+        self.assertIsNone(self.cache.get('key-1'))
+        self.assertEqual(self.cache.get('key-10'), 10)
+
+
+class IsolatedEnvironmentTest(TestCase):
+    site_cache = os.path.join(settings.BASE_DIR, 'cache')
+
+    def test_cache(self):
+        """Тесты работают с кешем во временном каталоге, а не в cache/"""
+        self.assertFalse(cache._path.startswith(self.site_cache))
+
+    def test_metrics(self):
+        """Метрики тестов пишутся во временный каталог, а не в cache/"""
+        self.assertFalse(
+            settings.METRICS_DATABASE.startswith(self.site_cache))
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    def test_headers(self):
+        """Число запросов и время в базе попадают в заголовки"""
+        response = self.client.get(
+            f'/posts/{QueryBudgetMiddlewareTest.post.id}/')
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertGreaterEqual(float(response['X-DB-Time']), 0)
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 0})
+    def test_budget_exceeded_in_tests(self):
+        """В тестах превышение бюджета — ошибка"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/')
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    def test_budgets_are_tight(self):
+        """Бюджет страницы не больше чем на запрос выше её числа
+        запросов, и лишний запрос сверх бюджета — ошибка"""
+        post = QueryBudgetMiddlewareTest.post
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        reader = User.objects.create_user(username='reader')
+        reader.follower.create(author=self.user)
+        self.client.force_login(reader)
+        pages = {
+            'posts:index': '/',
+            'posts:profile': f'/profile/{self.user.username}/',
+            'posts:post_detail': f'/posts/{post.id}/',
+            'posts:follow_index': '/follow/',
+            'posts:search': '/search/?q=Тестовый',
+        }
+        for view_name, url in pages.items():
+            with self.subTest(view_name=view_name):
+                cache.clear()
+                queries = int(self.client.get(url)['X-DB-Queries'])
+                budget = settings.QUERY_BUDGETS[view_name]
+                self.assertLessEqual(queries, budget)
+                self.assertLessEqual(budget - queries, 1)
+                cache.clear()
+                with override_settings(
+                        QUERY_BUDGETS={view_name: queries - 1}):
+                    with self.assertRaises(QueryBudgetExceeded):
+                        self.client.get(url)
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logged(self):
+        """Вне тестов превышение бюджета пишется в лог"""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', logs.output[0])
+
+
+class MetricsTest(TestCase):
+    INDEX_REQUESTS = (
+        'yatube_requests_total{method="GET",status="200",view="posts:index"}')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        override = override_settings(
+            METRICS_DATABASE=os.path.join(self.directory, 'metrics.sqlite3'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return response.content.decode(), samples
+
+    def test_page_metrics(self):
+        """Запросы страниц попадают в счётчики и гистограммы"""
+        _, before = self.scrape()
+        self.client.get('/')
+        self.client.get('/')
+        text, after = self.scrape()
+        self.assertEqual(
+            after[self.INDEX_REQUESTS] - before.get(self.INDEX_REQUESTS, 0),
+            2,
+        )
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{le="+Inf",view="posts:index"}', text)
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        self.assertIn(
+            'yatube_response_size_bytes_count{view="posts:index"}', text)
+
+    def test_workers_are_summed(self):
+        """Значения разных процессов складываются"""
+        self.client.get('/')
+        _, before = self.scrape()
+        other_worker = metrics.Registry()
+        other_worker.inc('yatube_requests_total', {
+            'method': 'GET', 'status': '200', 'view': 'posts:index'}, 5)
+        other_worker.flush()
+        _, after = self.scrape()
+        self.assertEqual(
+            after[self.INDEX_REQUESTS] - before[self.INDEX_REQUESTS], 5)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_hidden_from_other_ips(self):
+        """/metrics недоступен с чужих адресов"""
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """С METRICS_TOKEN /metrics открывается по токену, а не по адресу"""
+        response = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilerMiddlewareTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        override = override_settings(PROFILER_DIRECTORY=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_not_profiled_by_default(self):
+        """Без выборки и токена профили не пишутся"""
+        self.client.get('/')
+        self.client.get('/', HTTP_X_PROFILE='поддельный токен')
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profiled_with_token(self):
+        """Запрос с подписанным токеном профилируется"""
+        response = self.client.get(
+            '/', HTTP_X_PROFILE=profiling.make_token())
+        self.assertTrue(response['X-Profile'].endswith('posts.index.prof'))
+        self.assertEqual(os.listdir(self.directory), [response['X-Profile']])
+
+    @override_settings(PROFILER_SAMPLE_RATE=1, PROFILER_MAX_FILES=2)
+    def test_sampling_rotates_files(self):
+        """Выборочные профили хранятся в пределах лимита"""
+        for _ in range(3):
+            self.client.get('/')
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_report(self):
+        """profile_report объединяет профили по страницам"""
+        self.client.get('/')
+        self.client.get('/')
+        out = StringIO()
+        call_command('profile_report', stdout=out)
+        report = out.getvalue()
+        self.assertIn('posts:index: профилей 2', report)
+        self.assertIn('Шаблоны:', report)
+        self.assertIn('ORM:', report)
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_report_skips_broken_profiles(self):
+        """Испорченные профили и чужие файлы пропускаются"""
+        self.client.get('/')
+        for name, content in (
+                ('1.0-1-posts.index.prof', b'not a profile'),
+                ('2.0-1-posts.index.prof', b''),
+                ('notes.prof', b'')):
+            with open(os.path.join(self.directory, name), 'wb') as file:
+                file.write(content)
+        out = StringIO()
+        err = StringIO()
+        call_command('profile_report', stdout=out, stderr=err)
+        self.assertIn('posts:index: профилей 1', out.getvalue())
+        self.assertEqual(err.getvalue().count('испорченный профиль'), 2)
+
+
+class MediaServeTest(TestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.hashed = 'posts/ab/cd/' + 'abcd' * 16 + '.jpg'
+        for name in ('posts/old.jpg', self.hashed):
+            path = os.path.join(self.directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(self.content)
+
+    def get(self, name, **headers):
+        return self.client.get('/media/' + name, **headers)
+
+    def test_serves_file_from_open_file(self):
+        """Файл отдаётся как FileResponse с длиной и типом"""
+        response = media.serve(
+            RequestFactory().get('/media/posts/old.jpg'), 'posts/old.jpg')
+        self.assertIsNotNone(response.file_to_stream.fileno())
+        response.close()
+        response = self.get('posts/old.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}',
+        )
+
+    def test_hashed_names_are_immutable(self):
+        """Имена по содержимому кешируются навсегда и не зависят от
+        cookies"""
+        response = self.get(self.hashed)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertFalse(response.has_header('Vary'))
+
+    def test_conditional_requests(self):
+        """If-None-Match и If-Modified-Since дают 304"""
+        response = self.get('posts/old.jpg')
+        self.assertEqual(self.get(
+            'posts/old.jpg', HTTP_IF_NONE_MATCH=response['ETag'],
+        ).status_code, 304)
+        self.assertEqual(self.get(
+            'posts/old.jpg', HTTP_IF_MODIFIED_SINCE=http_date(),
+        ).status_code, 304)
+
+    def test_ranges(self):
+        """Один диапазон Range отдаётся с кодом 206"""
+        cases = (
+            ('bytes=0-9', 'bytes 0-9/1024', self.content[:10]),
+            ('bytes=1000-', 'bytes 1000-1023/1024', self.content[1000:]),
+            ('bytes=-4', 'bytes 1020-1023/1024', self.content[-4:]),
+        )
+        for header, content_range, content in cases:
+            with self.subTest(header=header):
+                response = self.get('posts/old.jpg', HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(
+                    response['Content-Length'], str(len(content)))
+                self.assertEqual(
+                    b''.join(response.streaming_content), content)
+        for name in ('posts/old.jpg', self.hashed):
+            with self.subTest(name=name):
+                response = self.get(name, HTTP_RANGE='bytes=2000-')
+                self.assertEqual(response.status_code, 416)
+                self.assertFalse(response.has_header('Cache-Control'))
+                self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.get(
+            'posts/old.jpg', HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+        self.assertEqual(self.get(
+            'posts/old.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"',
+        ).status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/internal-media/')
+    def test_accel_redirect(self):
+        """При MEDIA_ACCEL_REDIRECT файл отдаёт фронтовой сервер"""
+        response = self.get('posts/old.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/internal-media/posts/old.jpg')
+        self.assertEqual(response.content, b'')
+
+    def test_outside_media_root(self):
+        """Файлы вне MEDIA_ROOT и каталоги не отдаются"""
+        for name in ('../settings.py', 'posts', 'posts/missing.jpg'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0)
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', image='posts/test.jpg')
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+
+    def test_call_sites(self):
+        """Медленный запрос привязан к строке кода и шаблона"""
+        cache.clear()
+        with self.assertLogs('core.middleware', 'WARNING'):
+            self.client.get(f'/posts/{SlowQueryLogTest.post.id}/')
+        queries = SlowQuery.objects.filter(view='posts:post_detail')
+        self.assertTrue(queries.filter(
+            call_site__startswith='posts/views.py:').exists())
+        thumbnail_query = queries.get(sql__contains='thumbnail_kvstore')
+        self.assertTrue(thumbnail_query.template.startswith(
+            'posts/post_detail.html'))
+        self.assertIn('resolve_thumbnails', thumbnail_query.template)
+
+    @override_settings(SLOW_QUERY_LOG_SIZE=3)
+    def test_ring_buffer(self):
+        """В журнале остаются только последние записи"""
+        with self.assertLogs('core.middleware', 'WARNING'):
+            self.client.get('/')
+            self.client.get(f'/posts/{SlowQueryLogTest.post.id}/')
+        self.assertEqual(SlowQuery.objects.count(), 3)
+        self.assertEqual(
+            set(SlowQuery.objects.values_list('view', flat=True)),
+            {'posts:post_detail'},
+        )
+
+
+@override_settings(NPLUSONE_MODE='raise')
+class NPlusOneTest(TestCase):
+    AUTHORS = Template(
+        '{% for post in posts %}{{ post.author.username }}{% endfor %}')
+    COMMENTS = Template(
+        '{% for post in posts %}{{ post.comments.all|length }}{% endfor %}')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        for number in range(3):
+            post = Post.objects.create(author=cls.user, text=str(number))
+            Comment.objects.create(post=post, author=cls.user, text='1')
+
+    def test_lazy_relations_in_loop_raise(self):
+        """Ленивые связи в цикле шаблона — ошибка"""
+        for template in (self.AUTHORS, self.COMMENTS):
+            with self.subTest(template=template.source):
+                with self.assertRaises(nplusone.LazyLoadError):
+                    template.render(Context({'posts': Post.objects.all()}))
+
+    def test_loaded_relations_allowed(self):
+        """select_related, prefetch_related и связи вне цикла разрешены"""
+        self.AUTHORS.render(Context(
+            {'posts': Post.objects.select_related('author')}))
+        self.COMMENTS.render(Context(
+            {'posts': Post.objects.prefetch_related('comments')}))
+        Template('{{ post.author.username }}').render(
+            Context({'post': Post.objects.first()}))
+
+    @override_settings(NPLUSONE_MODE='warn')
+    def test_warnings_grouped_by_template_line(self):
+        """В режиме warn одно предупреждение на строку шаблона"""
+        self.AUTHORS.render(Context({'posts': Post.objects.all()}))
+        with self.assertWarns(nplusone.LazyLoadWarning) as warning:
+            nplusone.flush_warnings()
+        self.assertIn('Post.author загружена лениво 3 раз', str(
+            warning.warning))
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as metrics_registry
 
 
 def page_not_found(request, exception):
@@ -15,3 +20,22 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики для Prometheus: по токену METRICS_TOKEN в заголовке
+    Authorization: Bearer, если он задан, иначе с METRICS_ALLOWED_IPS."""
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {settings.METRICS_TOKEN}',
+        )
+    else:
+        allowed = (
+            request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS)
+    if not allowed:
+        raise Http404
+    return HttpResponse(
+        metrics_registry.render(metrics_registry.registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,17 +1,68 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
 
+from .deletion import BulkDeletion, DeletionIncomplete
 from .models import Group, Post, Comment, Follow
+from .search import to_match_query
+
+
+def message_incomplete(model_admin, request):
+    """Действие удаления упёрлось в BULK_DELETE_ADMIN_CHUNKS."""
+    model_admin.message_user(
+        request,
+        'Удалено не всё: за один раз удаляется не больше '
+        f'{settings.BULK_DELETE_ADMIN_CHUNKS} порций. Запустите действие '
+        'ещё раз или удалите остальное командой manage.py bulk_delete.',
+        messages.WARNING,
+    )
 
 
 class PostAdmin(admin.ModelAdmin):
+    actions = ('delete_in_chunks',)
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        match = to_match_query(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(search_index__text__match=match), False
+
+    def delete_in_chunks(self, request, queryset):
+        deletion = BulkDeletion(max_chunks=settings.BULK_DELETE_ADMIN_CHUNKS)
+        try:
+            deleted = deletion.delete_posts(queryset)
+        except DeletionIncomplete:
+            message_incomplete(self, request)
+            return
+        self.message_user(
+            request, f'Удалено постов: {deleted}.', messages.SUCCESS)
+    delete_in_chunks.short_description = 'Удалить порциями с комментариями'
+    delete_in_chunks.allowed_permissions = ('delete',)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    actions = ('delete_in_chunks',)
+
+    def delete_in_chunks(self, request, queryset):
+        deletion = BulkDeletion(max_chunks=settings.BULK_DELETE_ADMIN_CHUNKS)
+        try:
+            for group in queryset:
+                deletion.delete_group(group)
+        except DeletionIncomplete:
+            message_incomplete(self, request)
+            return
+        self.message_user(
+            request, f'Удалено групп: {len(queryset)}.', messages.SUCCESS)
+    delete_in_chunks.short_description = (
+        'Удалить порциями, оставив посты без группы')
+    delete_in_chunks.allowed_permissions = ('delete',)
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment)
 admin.site.register(Follow)
@@ -0,0 +1,157 @@
+"""Удаление пользователей, постов и групп порциями.
+
+Коллектор Django сначала загружает в память все зависимые объекты, а
+потом удаляет их в одной транзакции, и база надолго остаётся
+заблокированной. Здесь зависимые строки удаляются прямыми DELETE
+порциями по chunk_size, каждая порция в своей транзакции: блокировки
+короткие, а прерванное удаление можно просто запустить ещё раз — оно
+продолжит с того, что осталось. Сигналы при этом не отправляются,
+поэтому счётчики и ссылки на картинки поправляются здесь же, в той же
+транзакции, что и порция, а ленты сбрасываются после её фиксации.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .feed_cache import follow_feed, invalidate_author_feeds, invalidate_feeds
+from .images import release_image
+from .models import Comment, Follow, Post, TimelineEntry
+from .stats import rebuild_stats, recount_comments
+
+
+def _raw_delete(queryset):
+    """DELETE без коллектора и сигналов; возвращает число строк."""
+    return queryset._raw_delete(queryset.db)
+
+
+def _after_commit(invalidate, *args):
+    """Сбрасывает ленты после фиксации порции: иначе параллельный
+    запрос успеет закешировать их по ещё не удалённым строкам."""
+    transaction.on_commit(lambda: invalidate(*args))
+
+
+class DeletionIncomplete(Exception):
+    """Удаление остановлено на лимите порций; повторный запуск
+    продолжит его."""
+
+
+class BulkDeletion:
+    """Удаляет объекты и их зависимости порциями.
+
+    report(описание, число удалённых строк) вызывается после каждой
+    порции, например чтобы команда показала прогресс. После max_chunks
+    порций, если удалено ещё не всё, бросается DeletionIncomplete.
+    """
+
+    def __init__(self, chunk_size=None, report=None, max_chunks=None):
+        self.chunk_size = chunk_size or settings.BULK_DELETE_CHUNK_SIZE
+        self.report = report or (lambda label, total: None)
+        self.max_chunks = max_chunks
+        self.chunks_done = 0
+
+    def chunks(self, queryset, label, delete_chunk):
+        """Передаёт delete_chunk первые chunk_size id из queryset, пока
+        они не кончатся. Удалённые строки из queryset пропадают, поэтому
+        смещение не нужно, и повторный запуск начинает с оставшихся."""
+        total = 0
+        while True:
+            ids = list(
+                queryset.order_by('pk')
+                .values_list('pk', flat=True)[:self.chunk_size]
+            )
+            if not ids:
+                return total
+            if (self.max_chunks is not None
+                    and self.chunks_done >= self.max_chunks):
+                raise DeletionIncomplete
+            with transaction.atomic():
+                delete_chunk(ids)
+            self.chunks_done += 1
+            total += len(ids)
+            self.report(label, total)
+
+    def delete_comments(self, comments):
+        return self.chunks(comments, 'Комментарии', self._delete_comments)
+
+    def _delete_comments(self, ids):
+        comments = Comment.objects.filter(pk__in=ids)
+        post_ids = set(comments.values_list('post_id', flat=True))
+        author_ids = set(comments.values_list('author_id', flat=True))
+        _raw_delete(comments)
+        posts = Post.objects.filter(pk__in=post_ids)
+        recount_comments(posts)
+        rebuild_stats(author_ids)
+        rows = list(posts.values_list('author_id', 'group_id'))
+        _after_commit(
+            invalidate_author_feeds,
+            [author_id for author_id, _ in rows],
+            [group_id for _, group_id in rows],
+        )
+
+    def delete_posts(self, posts):
+        """Сначала комментарии и записи лент, затем сами посты."""
+        self.delete_comments(Comment.objects.filter(post__in=posts))
+        self.chunks(
+            TimelineEntry.objects.filter(post__in=posts),
+            'Записи лент', lambda ids: _raw_delete(
+                TimelineEntry.objects.filter(pk__in=ids)),
+        )
+        return self.chunks(posts, 'Посты', self._delete_posts)
+
+    def _delete_posts(self, ids):
+        posts = Post.objects.filter(pk__in=ids)
+        rows = list(posts.values_list('author_id', 'group_id', 'image'))
+        # То, что успели добавить после предыдущих порций.
+        _raw_delete(Comment.objects.filter(post_id__in=ids))
+        _raw_delete(TimelineEntry.objects.filter(post_id__in=ids))
+        _raw_delete(posts)
+        author_ids = {author_id for author_id, _, _ in rows}
+        rebuild_stats(author_ids)
+        for _, _, image in rows:
+            if image:
+                release_image(image)
+        _after_commit(
+            invalidate_author_feeds,
+            author_ids, [group_id for _, group_id, _ in rows])
+
+    def delete_user(self, user):
+        """Комментарии, посты, ленту и подписки пользователя, затем его
+        самого."""
+        self.delete_comments(Comment.objects.filter(author=user))
+        self.delete_posts(Post.objects.filter(author=user))
+        self.chunks(
+            TimelineEntry.objects.filter(user=user),
+            'Лента пользователя', lambda ids: _raw_delete(
+                TimelineEntry.objects.filter(pk__in=ids)),
+        )
+        self.chunks(
+            Follow.objects.filter(Q(user=user) | Q(author=user)),
+            'Подписки', lambda ids: self._delete_follows(user, ids),
+        )
+        user.delete()
+
+    def _delete_follows(self, user, ids):
+        follows = Follow.objects.filter(pk__in=ids)
+        pairs = list(follows.values_list('user_id', 'author_id'))
+        _raw_delete(follows)
+        # Посты пользователя уже удалены, из лент подписчиков тоже.
+        rebuild_stats({
+            other for pair in pairs for other in pair if other != user.pk})
+        _after_commit(invalidate_feeds, *(
+            follow_feed(follower_id)
+            for follower_id, author_id in pairs if author_id == user.pk
+        ))
+
+    def delete_group(self, group):
+        """Отвязывает посты от группы порциями, затем удаляет её."""
+        self.chunks(
+            Post.objects.filter(group=group), 'Посты группы',
+            lambda ids: self._detach_posts(group, ids),
+        )
+        group.delete()
+
+    def _detach_posts(self, group, ids):
+        posts = Post.objects.filter(pk__in=ids)
+        author_ids = set(posts.values_list('author_id', flat=True))
+        posts.update(group=None)
+        _after_commit(invalidate_author_feeds, author_ids, [group.pk])
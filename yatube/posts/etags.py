@@ -0,0 +1,68 @@
+from hashlib import md5
+
+from .feed_cache import (COMMENTS_FEED, GROUPS_FEED, INDEX_FEED, feed_versions,
+                         follow_feed, group_feed, profile_feed)
+from .models import AuthorStats, Group, Post
+
+
+def _etag(request, *parts):
+    """Склеивает валидаторы страницы с пользователем и курсором."""
+    parts = (
+        request.user.pk or 0, request.GET.get('cursor', ''), *parts)
+    return md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, *feed_versions(
+        INDEX_FEED, GROUPS_FEED, COMMENTS_FEED))
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug).values_list('id', flat=True).first()
+    if group_id is None:
+        return None
+    return _etag(
+        request, slug, *feed_versions(
+            group_feed(group_id), GROUPS_FEED, COMMENTS_FEED))
+
+
+def profile_etag(request, username):
+    stats = AuthorStats.objects.filter(
+        user__username=username
+    ).values_list(
+        'user_id', 'posts_count', 'comments_count',
+        'followers_count', 'following_count',
+    ).first()
+    if stats is None:
+        return None
+    feeds = [profile_feed(stats[0]), GROUPS_FEED, COMMENTS_FEED]
+    if request.user.is_authenticated:
+        feeds.append(follow_feed(request.user.pk))
+    return _etag(request, username, *stats, *feed_versions(*feeds))
+
+
+def _post_detail_state(request, post_id):
+    if not hasattr(request, '_post_detail_state'):
+        request._post_detail_state = Post.objects.filter(
+            pk=post_id
+        ).order_by().values_list(
+            'updated', 'last_comment__created', 'comments_count',
+            'author__stats__posts_count', 'group_id',
+        ).first()
+    return request._post_detail_state
+
+
+def post_detail_etag(request, post_id):
+    state = _post_detail_state(request, post_id)
+    if state is None:
+        return None
+    return _etag(request, post_id, *state, *feed_versions(GROUPS_FEED))
+
+
+def post_detail_last_modified(request, post_id):
+    state = _post_detail_state(request, post_id)
+    if state is None:
+        return None
+    updated, last_comment = state[:2]
+    return max(filter(None, (updated, last_comment)))
@@ -0,0 +1,75 @@
+import uuid
+from hashlib import md5
+
+from django.core.cache import cache
+
+from .models import Follow
+
+VERSION_KEY = 'feed-version:{}'
+INDEX_FEED = 'index'
+GROUPS_FEED = 'groups'
+# Меняется с каждым комментарием; входит только в ETag лент, ключи
+# фрагментов зависят от комментариев своей страницы (feed_cache_key).
+COMMENTS_FEED = 'comments'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def feed_versions(*feeds):
+    """Возвращает текущие версии лент, заводя новые для отсутствующих."""
+    keys = [VERSION_KEY.format(feed) for feed in feeds]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key) or uuid.uuid4().hex
+    return [versions[key] for key in keys]
+
+
+def feed_cache_key(feed, request, page=()):
+    """Ключ фрагмента ленты: версия ленты, версия групп, страница и
+    состояние её постов — комментарии и готовность миниатюр (их
+    разрешает view до фрагмента). Новый комментарий или готовая
+    миниатюра меняют ключ только тех страниц, где виден пост."""
+    state = md5(','.join(
+        f'{post.pk}-{post.comments_count}-{post.last_comment_id}-'
+        f'{getattr(getattr(post, "thumbnail", None), "is_placeholder", 0)}'
+        for post in page
+    ).encode()).hexdigest()
+    return ':'.join((
+        feed,
+        *feed_versions(feed, GROUPS_FEED),
+        request.GET.get('cursor', ''),
+        state,
+    ))
+
+
+def invalidate_feeds(*feeds):
+    cache.delete_many([VERSION_KEY.format(feed) for feed in feeds])
+
+
+def invalidate_post_feeds(post, *group_ids):
+    """Сбрасывает все ленты, в которых показывается пост."""
+    invalidate_author_feeds([post.author_id], [post.group_id, *group_ids])
+
+
+def invalidate_author_feeds(author_ids, group_ids=()):
+    """Сбрасывает ленты, в которых показываются посты авторов из групп."""
+    follower_ids = Follow.objects.filter(
+        author_id__in=author_ids).values_list('user_id', flat=True)
+    feeds = [INDEX_FEED]
+    feeds += [profile_feed(author_id) for author_id in set(author_ids)]
+    feeds += [
+        group_feed(group_id) for group_id in set(group_ids) if group_id]
+    feeds += [follow_feed(user_id) for user_id in set(follower_ids)]
+    invalidate_feeds(*feeds)
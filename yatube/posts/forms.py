@@ -1,6 +1,33 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.urls import reverse_lazy
 
-from .models import Post, Comment
+from .images import ImageRejected, ingest_image
+from .models import Post, Comment, Group, User
+
+
+class GroupSelect(forms.Select):
+    """Select, в котором есть только выбранная группа.
+
+    Остальные варианты подгружает скрипт формы из posts:group_choices
+    по мере ввода, поэтому страница не зависит от числа групп.
+    """
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.attrs['data-choices-url'] = reverse_lazy('posts:group_choices')
+
+    def optgroups(self, name, value, attrs=None):
+        iterator = self.choices
+        selected = [pk for pk in value if str(pk).isdigit()]
+        self.choices = [('', iterator.field.empty_label)] + [
+            iterator.choice(group)
+            for group in iterator.queryset.filter(pk__in=selected)
+        ]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
 
 
 class PostForm(forms.ModelForm):
@@ -15,9 +42,49 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост',
             'image': 'Загрузка изображения для поста',
         }
+        widgets = {
+            'group': GroupSelect,
+        }
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            try:
+                image = ingest_image(image)
+            except ImageRejected as error:
+                raise forms.ValidationError(str(error))
+            self.instance.image_width = image.width
+            self.instance.image_height = image.height
+            self.instance.image_size = image.size
+        elif not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            self.instance.image_size = None
+        return image
 
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(
+        label='Поиск',
+        max_length=200,
+    )
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        label='Группа',
+        widget=forms.TextInput,
+    )
+    author = forms.ModelChoiceField(
+        queryset=User.objects.all(),
+        to_field_name='username',
+        required=False,
+        label='Автор',
+        widget=forms.TextInput,
+    )
@@ -0,0 +1,63 @@
+"""Подбор групп по началу названия для поля группы в форме поста.
+
+Ответы для коротких префиксов кешируются под версией GROUPS_FEED: она
+сбрасывается при любом изменении групп, поэтому устаревшие списки
+просто перестают читаться.
+Поиск идёт диапазоном по индексу на title, без полного просмотра.
+"""
+import heapq
+import itertools
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .feed_cache import GROUPS_FEED, feed_versions
+from .models import Group
+
+# Больше любого символа, который может стоять в названии после префикса.
+MAX_CHAR = '\U0010ffff'
+
+
+def _variants(prefix):
+    if not prefix:
+        return {''}
+    return {
+        prefix,
+        prefix[:1].upper() + prefix[1:],
+        prefix[:1].lower() + prefix[1:],
+    }
+
+
+def find_groups(prefix=''):
+    """Список (id, title) первых групп, название которых начинается
+    с prefix; первая буква префикса сравнивается без учёта регистра.
+
+    От prefix берутся первые GROUP_CHOICES_MAX_PREFIX символов.
+    """
+    prefix = prefix.strip()[:settings.GROUP_CHOICES_MAX_PREFIX]
+    if len(prefix) > settings.GROUP_CHOICES_CACHED_PREFIX:
+        return _find_groups(prefix)
+    version, = feed_versions(GROUPS_FEED)
+    key = 'group-choices:{}:{}'.format(
+        version, md5(prefix.encode()).hexdigest())
+    choices = cache.get(key)
+    if choices is None:
+        choices = _find_groups(prefix)
+        cache.set(key, choices, settings.GROUP_CHOICES_CACHE_TIMEOUT)
+    return choices
+
+
+def _find_groups(prefix):
+    limit = settings.GROUP_CHOICES_LIMIT
+    # Каждый вариант префикса — отдельный диапазон индекса, уже
+    # упорядоченный по title: OR заставил бы SQLite сортировать все
+    # найденные группы ради первых limit.
+    ranges = [
+        Group.objects.filter(
+            title__gte=variant, title__lt=variant + MAX_CHAR
+        ).order_by('title', 'id').values_list('id', 'title')[:limit]
+        for variant in _variants(prefix)
+    ]
+    return list(itertools.islice(heapq.merge(
+        *ranges, key=lambda choice: (choice[1], choice[0])), limit))
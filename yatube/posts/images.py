@@ -0,0 +1,121 @@
+"""Приём картинок постов: ограничение размера, пережатие, без метаданных.
+
+Загруженная картинка поворачивается по EXIF Orientation, уменьшается до
+POST_IMAGE_MAX_SIZE и сохраняется заново в POST_IMAGE_FORMAT с качеством
+POST_IMAGE_QUALITY. Остальные метаданные (EXIF, GPS, профили камеры) при
+этом теряются. Картинки с прозрачностью сохраняются в PNG, GIF остаются
+GIF. Анимации (GIF, WebP, APNG) пересохраняются покадрово в своём
+формате; если кадров вместе больше POST_ANIMATION_MAX_PIXELS пикселей,
+загрузка отклоняется.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+
+from .models import Post
+from .thumbnails import queue_cleanup
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Всё остальное из image.info (exif, xmp, комментарии) не сохраняется.
+KEEP_INFO = ('transparency', 'icc_profile')
+
+
+class ImageRejected(ValueError):
+    """Картинку нельзя принять; текст исключения — для пользователя."""
+
+
+class IngestedImage(ContentFile):
+    """Пережатая картинка с размерами для полей поста."""
+
+    def __init__(self, content, name, width, height):
+        super().__init__(content, name=name)
+        self.width = width
+        self.height = height
+
+
+def ingest_image(upload):
+    """Загруженный файл картинки -> IngestedImage для Post.image."""
+    upload.seek(0)
+    image = Image.open(upload)
+    name = os.path.basename(upload.name)
+    if getattr(image, 'is_animated', False):
+        return _ingest_animation(image, name)
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    # JPEG умеет декодироваться сразу в уменьшенном размере.
+    image.draft('RGB', max_size)
+    image_format = _target_format(image)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    image.info = info = {
+        key: image.info[key] for key in KEEP_INFO if key in image.info}
+    output = BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(
+            output, image_format, quality=settings.POST_IMAGE_QUALITY,
+            optimize=True, progressive=True, **info,
+        )
+    elif image_format == 'WEBP':
+        image.save(
+            output, image_format, quality=settings.POST_IMAGE_QUALITY,
+            **info,
+        )
+    else:
+        image.save(output, image_format, optimize=True, **info)
+    name = os.path.splitext(name)[0] + '.' + EXTENSIONS[image_format]
+    return IngestedImage(output.getvalue(), name, image.width, image.height)
+
+
+def _ingest_animation(image, name):
+    """Уменьшает кадры анимации до POST_IMAGE_MAX_SIZE и сохраняет их
+    заново без метаданных."""
+    max_width, max_height = settings.POST_IMAGE_MAX_SIZE
+    scale = min(1, max_width / image.width, max_height / image.height)
+    size = (max(1, round(image.width * scale)),
+            max(1, round(image.height * scale)))
+    if image.n_frames * size[0] * size[1] > settings.POST_ANIMATION_MAX_PIXELS:
+        raise ImageRejected(
+            'Анимация слишком большая: уменьшите её или сократите число '
+            'кадров.'
+        )
+    image_format = image.format if image.format in ('GIF', 'WEBP') else 'PNG'
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA').resize(size, Image.LANCZOS)
+        frame.info = {}
+        frames.append(frame)
+    params = {'duration': durations}
+    if 'loop' in image.info:
+        params['loop'] = image.info['loop']
+    if image_format == 'WEBP':
+        params['quality'] = settings.POST_IMAGE_QUALITY
+    output = BytesIO()
+    frames[0].save(
+        output, image_format, save_all=True, append_images=frames[1:],
+        **params,
+    )
+    name = os.path.splitext(name)[0] + '.' + EXTENSIONS[image_format]
+    return IngestedImage(output.getvalue(), name, *size)
+
+
+def _target_format(image):
+    if image.format == 'GIF':
+        return 'GIF'
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        return 'PNG'
+    return settings.POST_IMAGE_FORMAT
+
+
+def retain_image(name):
+    Post._meta.get_field('image').storage.retain(name)
+
+
+def release_image(name):
+    """Снимает ссылку поста на картинку; с последней ссылкой файл и его
+    миниатюры удаляются в фоне после фиксации транзакции."""
+    if Post._meta.get_field('image').storage.release(name):
+        queue_cleanup(name)
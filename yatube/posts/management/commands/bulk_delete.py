@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.deletion import BulkDeletion
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет пользователей, группы или посты вместе с зависимыми '
+        'данными порциями, не блокируя базу надолго. Прерванное удаление '
+        'продолжается повторным запуском с теми же аргументами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', default=[], metavar='USERNAME',
+            help='Удалить пользователя со всеми его данными.',
+        )
+        parser.add_argument(
+            '--group', action='append', default=[], metavar='SLUG',
+            help='Удалить группу; посты останутся без группы.',
+        )
+        parser.add_argument(
+            '--post', action='append', default=[], type=int, metavar='ID',
+            help='Удалить пост с комментариями.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Сколько строк удалять за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        if not (options['user'] or options['group'] or options['post']):
+            raise CommandError('Укажите --user, --group или --post.')
+        deletion = BulkDeletion(options['chunk_size'], self.report)
+        for username in options['user']:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                self.stdout.write(f'Пользователя {username} нет.')
+                continue
+            deletion.delete_user(user)
+            self.stdout.write(f'Пользователь {username} удалён.')
+        for slug in options['group']:
+            group = Group.objects.filter(slug=slug).first()
+            if group is None:
+                self.stdout.write(f'Группы {slug} нет.')
+                continue
+            deletion.delete_group(group)
+            self.stdout.write(f'Группа {slug} удалена.')
+        if options['post']:
+            deleted = deletion.delete_posts(
+                Post.objects.filter(pk__in=options['post']))
+            self.stdout.write(f'Удалено постов: {deleted}.')
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def report(self, label, total):
+        self.stdout.write(f'{label}: {total}')
@@ -0,0 +1,260 @@
+import itertools
+import multiprocessing
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts.models import Comment, Follow, Group, Post
+from posts.stats import recount_comments
+
+User = get_user_model()
+
+VOCABULARY_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу случайными пользователями, группами, постами, '
+        'комментариями и подписками. При одинаковом --seed данные '
+        'получаются одинаковыми независимо от --processes, даты '
+        'отсчитываются от момента запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк генерировать и вставлять за раз.',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Сколько процессов генерируют строки. Пишет в базу '
+                 'только основной процесс.',
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель степенного распределения авторов '
+                 'в постах и подписках.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней раскидать даты публикаций.',
+        )
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Не заполнять ленты подписок после генерации.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.pool = None
+        if options['processes'] > 1:
+            self.pool = multiprocessing.Pool(options['processes'])
+        if not connection.in_atomic_block:
+            # Данные одноразовые: fsync после каждой пачки не нужен.
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+        try:
+            with _without_auto_now(Post, 'pub_date'), \
+                    _without_auto_now(Comment, 'created'):
+                self.generate()
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+        call_command('rebuild_author_stats', stdout=self.stdout)
+        self.stdout.write('Пересчёт комментариев постов...')
+        recount_comments()
+        if not options['skip_timelines']:
+            self.stdout.write('Заполнение лент подписок...')
+            _rebuild_timelines()
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы.'))
+
+    def generate(self):
+        options = self.options
+        context = {
+            'seed': options['seed'],
+            'now': timezone.now(),
+            'days': options['days'],
+            'zipf': options['zipf'],
+        }
+        context['users'] = self.insert(
+            User, 'users', options['users'], context)
+        context['groups'] = self.insert(
+            Group, 'groups', options['groups'], context)
+        if not range(*context['users']):
+            return
+        context['posts'] = self.insert(
+            Post, 'posts', options['posts'], context)
+        if range(*context['posts']):
+            self.insert(Comment, 'comments', options['comments'], context)
+        if len(range(*context['users'])) > 1:
+            self.insert(Follow, 'follows', options['follows'], context)
+
+    def insert(self, model, kind, total, context):
+        """Вставляет total строк и возвращает диапазон их id.
+
+        Генератор — единственный писатель в базу, поэтому id вставленных
+        подряд строк идут без пропусков. Первый id берётся из базы: после
+        удалений AUTOINCREMENT не переиспользует освободившиеся номера.
+        """
+        batch_size = self.options['batch_size']
+        tasks = [
+            (kind, index, start, min(batch_size, total - start), context)
+            for index, start in enumerate(range(0, total, batch_size))
+        ]
+        if self.pool is not None:
+            batches = self.pool.imap(_generate_batch, tasks)
+        else:
+            batches = map(_generate_batch, tasks)
+        last_id = _last_id(model)
+        done = 0
+        for rows in batches:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [model(**row) for row in rows],
+                    ignore_conflicts=model is Follow,
+                )
+            done += len(rows)
+            self.stdout.write(f'{kind}: {done}/{total}')
+        first_id = model.objects.filter(pk__gt=last_id).order_by(
+            'pk').values_list('pk', flat=True).first()
+        if first_id is None:
+            return 0, 0
+        return first_id, _last_id(model) + 1
+
+
+def _last_id(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return last or 0
+
+
+@contextmanager
+def _without_auto_now(model, field_name):
+    """Позволяет задать дату вручную в полях с auto_now_add."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+@lru_cache(maxsize=None)
+def _vocabulary(seed):
+    faker = Faker('ru_RU')
+    faker.seed_instance(seed)
+    return faker.words(VOCABULARY_SIZE)
+
+
+@lru_cache(maxsize=4)
+def _zipf_weights(size, exponent):
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def _generate_batch(task):
+    kind, index, start, size, context = task
+    rng = random.Random(f'{context["seed"]}:{kind}:{index}')
+    words = _vocabulary(context['seed'])
+    return [
+        ROW_FACTORIES[kind](rng, words, context, start + i)
+        for i in range(size)
+    ]
+
+
+def _text(rng, words, low, high):
+    return ' '.join(rng.choices(words, k=rng.randint(low, high))).capitalize()
+
+
+def _date(rng, context):
+    return context['now'] - timedelta(
+        seconds=rng.randrange(context['days'] * 24 * 60 * 60))
+
+
+def _author(rng, context):
+    first, end = context['users']
+    weights = _zipf_weights(end - first, context['zipf'])
+    return first + rng.choices(range(end - first), cum_weights=weights)[0]
+
+
+def _user_row(rng, words, context, number):
+    return {
+        'username': f'gen{context["seed"]}_{number}',
+        'first_name': rng.choice(words).capitalize(),
+        'last_name': rng.choice(words).capitalize(),
+        'password': f'{UNUSABLE_PASSWORD_PREFIX}generated',
+        'date_joined': _date(rng, context),
+    }
+
+
+def _group_row(rng, words, context, number):
+    return {
+        'title': _text(rng, words, 1, 3),
+        'slug': f'gen{context["seed"]}-{number}',
+        'description': _text(rng, words, 5, 30),
+    }
+
+
+def _post_row(rng, words, context, number):
+    groups = range(*context['groups'])
+    return {
+        'text': _text(rng, words, 5, 80),
+        'pub_date': _date(rng, context),
+        'author_id': _author(rng, context),
+        'group_id': (
+            rng.choice(groups) if groups and rng.random() < 0.7 else None),
+    }
+
+
+def _comment_row(rng, words, context, number):
+    return {
+        'text': _text(rng, words, 1, 30),
+        'created': _date(rng, context),
+        'post_id': rng.randrange(*context['posts']),
+        'author_id': rng.randrange(*context['users']),
+    }
+
+
+def _follow_row(rng, words, context, number):
+    user_id = rng.randrange(*context['users'])
+    author_id = _author(rng, context)
+    while author_id == user_id:
+        author_id = _author(rng, context)
+    return {'user_id': user_id, 'author_id': author_id}
+
+
+ROW_FACTORIES = {
+    'users': _user_row,
+    'groups': _group_row,
+    'posts': _post_row,
+    'comments': _comment_row,
+    'follows': _follow_row,
+}
+
+
+def _rebuild_timelines():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT OR IGNORE INTO posts_timelineentry '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            'FROM posts_follow AS follow '
+            'JOIN posts_post AS post ON post.author_id = follow.author_id'
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import ingest_image
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускает уже загруженные картинки постов через posts.images: '
+        'уменьшает, пережимает и записывает размеры. Старые файлы и их '
+        'миниатюры удаляются, если на них больше никто не ссылается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать и картинки, у которых размеры уже записаны.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        if not options['all']:
+            posts = posts.filter(image_size__isnull=True)
+        before = after = 0
+        for post in posts.iterator():
+            old = post.image
+            try:
+                with old.open('rb'):
+                    image = ingest_image(old)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{old.name}: {error}')
+                continue
+            before += old.size
+            after += image.size
+            post.image.save(image.name, image, save=False)
+            post.image_width = image.width
+            post.image_height = image.height
+            post.image_size = image.size
+            post.save(update_fields=(
+                'image', 'image_width', 'image_height', 'image_size'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинки пережаты: {before} -> {after} байт.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из общего каталога posts/ в хранилище '
+        'с именами по содержимому (core.storage). Файлы читаются '
+        'потоком, одинаковые картинки остаются одним файлом, старые '
+        'файлы и их миниатюры удаляются.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='').order_by('pk')
+        moved = missing = 0
+        for post in posts.iterator():
+            if storage.is_hashed(post.image.name):
+                continue
+            try:
+                with post.image.open('rb'):
+                    name = storage.save(post.image.name, post.image)
+            except FileNotFoundError:
+                self.stderr.write(f'{post.image.name}: файла нет')
+                missing += 1
+                continue
+            post.image = name
+            post.save(update_fields=('image',))
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, без файла: {missing}.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит миниатюры всех картинок постов, например после '
+        'изменения THUMBNAIL_SRCSET.'
+    )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').order_by('pk').values_list(
+            'image', flat=True).iterator()
+        total = 0
+        for name in images:
+            generate_thumbnails(name)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры подготовлены для {total} картинок.'))
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.stats import rebuild_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику авторов порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей пересчитывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        total = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            self.rebuild_chunk(user_ids)
+            last_id = user_ids[-1]
+            total += len(user_ids)
+            self.stdout.write(f'Пересчитано пользователей: {total}')
+        self.stdout.write(self.style.SUCCESS('Статистика пересчитана.'))
+
+    @transaction.atomic
+    def rebuild_chunk(self, user_ids):
+        rebuild_stats(user_ids)
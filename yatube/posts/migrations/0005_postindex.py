@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+CREATE_INDEX = [
+    """CREATE VIRTUAL TABLE posts_postindex USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER posts_postindex_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER posts_postindex_delete AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER posts_postindex_update AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO posts_postindex (posts_postindex) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER posts_postindex_update',
+    'DROP TRIGGER posts_postindex_delete',
+    'DROP TRIGGER posts_postindex_insert',
+    'DROP TABLE posts_postindex',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostIndex',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='posts.Post')),
+                ('text', posts.models.SearchField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_postindex',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
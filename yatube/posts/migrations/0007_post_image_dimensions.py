@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:02
+
+from django.db import migrations, models
+
+# SQLite добавляет поля, пересоздавая таблицу posts_post, а вместе с ней
+# пропадают триггеры полнотекстового индекса из 0005_postindex.
+CREATE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_insert
+    AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_delete
+    AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_update
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, CREATE_TRIGGERS),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер картинки, байт'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, migrations.RunSQL.noop),
+    ]
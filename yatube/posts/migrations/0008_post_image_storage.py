@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+import core.storage
+
+# SQLite меняет поле, пересоздавая таблицу posts_post, а вместе с ней
+# пропадают триггеры полнотекстового индекса из 0005_postindex.
+CREATE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_insert
+    AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_delete
+    AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_update
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, CREATE_TRIGGERS),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, migrations.RunSQL.noop),
+    ]
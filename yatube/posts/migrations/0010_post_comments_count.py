@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# SQLite добавляет поля, пересоздавая таблицу posts_post, а вместе с ней
+# пропадают триггеры полнотекстового индекса из 0005_postindex.
+CREATE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_insert
+    AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_delete
+    AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_postindex_update
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_postindex (posts_postindex, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_postindex (rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+
+def fill_comment_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    Post.objects.update(
+        comments_count=Coalesce(Subquery(
+            comments.values('post').annotate(total=Count('id'))
+            .values('total'),
+            output_field=IntegerField(),
+        ), 0),
+        last_comment=Subquery(
+            comments.order_by('-created', '-id').values('id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_comment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, CREATE_TRIGGERS),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_comment',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.Comment', verbose_name='Последний комментарий'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, migrations.RunSQL.noop),
+        migrations.RunPython(
+            fill_comment_counters, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -18,6 +20,11 @@ class Group(models.Model):
         'Описание группы',
     )
 
+    class Meta:
+        indexes = (
+            models.Index(fields=('title',), name='group_title_idx'),
+        )
+
     def __str__(self):
         return self.title
 
@@ -31,6 +38,10 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -48,11 +59,58 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    last_comment = models.ForeignKey(
+        'Comment',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        editable=False,
+        verbose_name='Последний комментарий',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', 'pub_date', 'id'),
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='post_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -81,6 +139,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_id_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -100,5 +164,118 @@ class Follow(models.Model):
         verbose_name='Тот на кого подписываются',
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='follow_user_author_unique',
+            ),
+        )
+
     def __str__(self):
         return f'Подписка на пользователя {self.author}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Владелец ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        unique_together = ('user', 'post')
+        indexes = (
+            models.Index(
+                fields=('user', 'pub_date', 'id'),
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'Пост {self.post_id} в ленте пользователя {self.user_id}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.IntegerField(
+        'Количество постов',
+        default=0,
+    )
+    comments_count = models.IntegerField(
+        'Количество комментариев',
+        default=0,
+    )
+    followers_count = models.IntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
+    following_count = models.IntegerField(
+        'Количество подписок',
+        default=0,
+    )
+
+    def __str__(self):
+        return f'Статистика пользователя {self.user_id}'
+
+
+class SearchField(models.TextField):
+    """Колонка полнотекстового индекса SQLite FTS5."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostIndex(models.Model):
+    """Полнотекстовый индекс по тексту постов.
+
+    Таблица FTS5 создаётся миграцией и заполняется триггерами на
+    posts_post, поэтому Django её не изменяет.
+    """
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index',
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_postindex'
@@ -0,0 +1,28 @@
+import re
+
+from .models import Post
+
+SEARCH_KEYS = ('search_index__rank', '-id')
+
+
+def to_match_query(text):
+    """Превращает ввод пользователя в запрос FTS5.
+
+    Каждое слово ищется как префикс, слова объединяются через AND, а
+    операторы FTS5 из ввода не интерпретируются.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_posts(text, group=None, author=None):
+    match = to_match_query(text)
+    if not match:
+        return Post.objects.none()
+    post_list = Post.objects.select_related('group', 'author').filter(
+        search_index__text__match=match)
+    if group is not None:
+        post_list = post_list.filter(group=group)
+    if author is not None:
+        post_list = post_list.filter(author=author)
+    return post_list
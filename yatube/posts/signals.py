@@ -0,0 +1,115 @@
+import threading
+
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .feed_cache import (COMMENTS_FEED, GROUPS_FEED, follow_feed,
+                         invalidate_feeds, invalidate_post_feeds)
+from .images import release_image, retain_image
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .stats import bump_stats, recount_comments
+from .thumbnails import queue_thumbnails
+from .timeline import backfill_timeline, fan_out_post, prune_timeline
+
+
+# id постов, которые сейчас удаляются: их комментарии уходят каскадом,
+# и пересчитывать счётчики поста для каждого из них незачем.
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    # У нового пользователя все счётчики нулевые: строка заводится сразу,
+    # чтобы первый пост или подписка не пересчитывали их по базе.
+    if created and not raw:
+        AuthorStats.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_previous(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+        bump_stats(instance.author_id, 'posts_count', 1)
+    invalidate_post_feeds(
+        instance, getattr(instance, '_previous_group_id', None))
+    previous_image = getattr(instance, '_previous_image', '')
+    if (instance.image.name or '') != previous_image:
+        if instance.image:
+            retain_image(instance.image.name)
+            queue_thumbnails(instance.image.name)
+        if previous_image:
+            release_image(previous_image)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+    bump_stats(instance.author_id, 'posts_count', -1)
+    invalidate_post_feeds(instance)
+    if instance.image:
+        release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        bump_stats(instance.author_id, 'comments_count', 1)
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1, last_comment=instance)
+        invalidate_feeds(COMMENTS_FEED)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_stats(instance.author_id, 'comments_count', -1)
+    if instance.post_id in _deleting_posts():
+        return
+    recount_comments(Post.objects.filter(pk=instance.post_id))
+    invalidate_feeds(COMMENTS_FEED)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.user_id, instance.author_id)
+        bump_stats(instance.author_id, 'followers_count', 1)
+        bump_stats(instance.user_id, 'following_count', 1)
+        invalidate_feeds(follow_feed(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    prune_timeline(instance.user_id, instance.author_id)
+    bump_stats(instance.author_id, 'followers_count', -1)
+    bump_stats(instance.user_id, 'following_count', -1)
+    invalidate_feeds(follow_feed(instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    invalidate_feeds(GROUPS_FEED)
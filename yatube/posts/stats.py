@@ -0,0 +1,83 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post
+
+COUNTERS = (
+    ('posts_count', Post, 'author'),
+    ('comments_count', Comment, 'author'),
+    ('followers_count', Follow, 'author'),
+    ('following_count', Follow, 'user'),
+)
+
+
+def count_stats(user_id):
+    """Считает статистику автора по данным в базе."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'comments_count': Comment.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def rebuild_stats(user_ids):
+    """Пересчитывает статистику пользователей user_ids по данным в базе
+    (по одному GROUP BY на счётчик)."""
+    counts = {user_id: {} for user_id in user_ids}
+    for field, model, key in COUNTERS:
+        rows = (
+            model.objects.filter(**{f'{key}__in': user_ids})
+            .order_by().values(key).annotate(total=Count('pk'))
+        )
+        for row in rows:
+            counts[row[key]][field] = row['total']
+    existing = AuthorStats.objects.in_bulk(user_ids)
+    to_create = []
+    to_update = []
+    for user_id, values in counts.items():
+        stats = existing.get(user_id) or AuthorStats(user_id=user_id)
+        for field, _, _ in COUNTERS:
+            setattr(stats, field, values.get(field, 0))
+        if user_id in existing:
+            to_update.append(stats)
+        else:
+            to_create.append(stats)
+    AuthorStats.objects.bulk_create(to_create)
+    AuthorStats.objects.bulk_update(
+        to_update, [field for field, _, _ in COUNTERS])
+
+
+def get_author_stats(user):
+    """Возвращает статистику автора, создавая её при первом обращении."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        stats, _ = AuthorStats.objects.get_or_create(
+            user=user, defaults=count_stats(user.pk))
+        return stats
+
+
+def bump_stats(user_id, field, delta):
+    """Атомарно меняет счётчик автора на delta."""
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+    if not updated and delta > 0:
+        AuthorStats.objects.get_or_create(
+            user_id=user_id, defaults=count_stats(user_id))
+
+
+def recount_comments(posts=None):
+    """Пересчитывает comments_count и last_comment постов одним UPDATE."""
+    if posts is None:
+        posts = Post.objects.all()
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    return posts.update(
+        comments_count=Coalesce(Subquery(
+            comments.values('post').annotate(total=Count('id'))
+            .values('total'),
+            output_field=IntegerField(),
+        ), 0),
+        last_comment=Subquery(
+            comments.order_by('-created', '-id').values('id')[:1]),
+    )
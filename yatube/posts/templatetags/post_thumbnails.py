@@ -0,0 +1,11 @@
+from django import template
+
+from ..thumbnails import attach_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def resolve_thumbnails(posts, preset):
+    attach_thumbnails(posts, preset)
+    return ''
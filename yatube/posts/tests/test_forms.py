@@ -1,7 +1,12 @@
-from django.test import TestCase, Client
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Group, Post
 
 
@@ -82,3 +87,95 @@ class PostFormTest(TestCase):
         post = Post.objects.get(id=PostFormTest.post.id)
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group, PostFormTest.group)
+
+
+@override_settings(
+    POST_IMAGE_MAX_SIZE=(100, 100),
+    POST_IMAGE_FORMAT='JPEG',
+    POST_IMAGE_QUALITY=80,
+)
+class PostImageIngestTest(TestCase):
+    @staticmethod
+    def upload(name, image, image_format, **params):
+        content = BytesIO()
+        image.save(content, image_format, **params)
+        return SimpleUploadedFile(name, content.getvalue())
+
+    def clean(self, upload):
+        form = PostForm(data={'text': 'Текст'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def test_photo_bounded_and_reencoded(self):
+        """Фото уменьшается, поворачивается по EXIF и теряет метаданные"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        upload = self.upload(
+            'photo.png', Image.new('RGB', (400, 200), 'red'), 'PNG',
+            exif=exif.tobytes(),
+        )
+        form = self.clean(upload)
+        image_file = form.cleaned_data['image']
+        self.assertEqual(image_file.name, 'photo.jpg')
+        image = Image.open(image_file)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (50, 100))
+        self.assertNotIn('exif', image.info)
+        self.assertEqual(form.instance.image_width, 50)
+        self.assertEqual(form.instance.image_height, 100)
+        self.assertEqual(form.instance.image_size, image_file.size)
+        self.assertLess(image_file.size, upload.size)
+
+    def test_transparent_image_kept_lossless(self):
+        """Картинка с прозрачностью остаётся PNG"""
+        form = self.clean(self.upload(
+            'logo.png', Image.new('RGBA', (20, 10), (0, 0, 0, 0)), 'PNG'))
+        image = Image.open(form.cleaned_data['image'])
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.mode, 'RGBA')
+        self.assertEqual(
+            (form.instance.image_width, form.instance.image_height),
+            (20, 10),
+        )
+
+    def animation(self, name, image_format, size, count=3):
+        frames = [
+            Image.new('RGB', size, color)
+            for color in ('red', 'green', 'blue')[:count]
+        ]
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        return self.upload(
+            name, frames[0], image_format, save_all=True,
+            append_images=frames[1:], duration=50, loop=0,
+            exif=exif.tobytes(),
+        )
+
+    def test_animation_bounded_and_resaved(self):
+        """Анимации уменьшаются покадрово и теряют метаданные"""
+        for name, image_format in (('cat.gif', 'GIF'), ('cat.png', 'PNG')):
+            with self.subTest(image_format=image_format):
+                form = self.clean(
+                    self.animation(name, image_format, (400, 200)))
+                image_file = form.cleaned_data['image']
+                self.assertEqual(image_file.name, name)
+                image = Image.open(image_file)
+                self.assertEqual(image.format, image_format)
+                self.assertEqual(image.size, (100, 50))
+                self.assertEqual(image.n_frames, 3)
+                self.assertNotIn('exif', image.info)
+                self.assertEqual(
+                    (form.instance.image_width, form.instance.image_height),
+                    (100, 50),
+                )
+
+    @override_settings(POST_ANIMATION_MAX_PIXELS=10_000)
+    def test_oversized_animation_rejected(self):
+        """Слишком большая анимация не принимается"""
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': self.animation('cat.gif', 'GIF', (400, 200))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -1,7 +1,16 @@
+from io import StringIO
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post
+from ..deletion import BulkDeletion
+from ..models import AuthorStats, Comment, Follow, Group, Post
+from ..search import search_posts
 
 
 User = get_user_model()
@@ -89,3 +98,265 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_name = post.text[:15]
         self.assertEqual(expected_name, post.__str__())
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_signals(self):
+        """Счётчики автора меняются вместе с постами, комментариями
+        и подписками"""
+        post = Post.objects.create(author=AuthorStatsTest.author, text='1')
+        Post.objects.create(author=AuthorStatsTest.author, text='2')
+        Comment.objects.create(
+            post=post, author=AuthorStatsTest.reader, text='Комментарий')
+        Follow.objects.create(
+            user=AuthorStatsTest.reader, author=AuthorStatsTest.author)
+        author_stats = AuthorStats.objects.get(user=AuthorStatsTest.author)
+        reader_stats = AuthorStats.objects.get(user=AuthorStatsTest.reader)
+        self.assertEqual(author_stats.posts_count, 2)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+
+        post.delete()
+        author_stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(reader_stats.comments_count, 0)
+
+    def test_rebuild_command_fixes_drift(self):
+        """Команда rebuild_author_stats исправляет разошедшиеся счётчики"""
+        Post.objects.create(author=AuthorStatsTest.author, text='1')
+        AuthorStats.objects.filter(user=AuthorStatsTest.author).update(
+            posts_count=100, followers_count=5)
+        call_command('rebuild_author_stats', chunk_size=1, stdout=StringIO())
+        author_stats = AuthorStats.objects.get(user=AuthorStatsTest.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertTrue(
+            AuthorStats.objects.filter(user=AuthorStatsTest.reader).exists())
+
+
+class PostCommentCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def test_counters_follow_comments(self):
+        """comments_count и last_comment поста меняются вместе
+        с комментариями"""
+        post = PostCommentCountersTest.post
+        first = Comment.objects.create(
+            post=post, author=PostCommentCountersTest.author, text='1')
+        second = Comment.objects.create(
+            post=post, author=PostCommentCountersTest.author, text='2')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(post.last_comment, second)
+
+        second.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.last_comment, first)
+
+        first.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertIsNone(post.last_comment)
+
+    def test_post_delete_skips_comment_recount(self):
+        """Удаление поста не пересчитывает его счётчики для каждого
+        комментария каскада"""
+        def delete_post(comments):
+            post = Post.objects.create(
+                author=PostCommentCountersTest.author, text='Пост')
+            for i in range(comments):
+                Comment.objects.create(
+                    post=post, author=PostCommentCountersTest.author,
+                    text=str(i))
+            with CaptureQueriesContext(connection) as context:
+                post.delete()
+            return [query['sql'] for query in context.captured_queries]
+
+        few, many = delete_post(1), delete_post(20)
+        self.assertEqual(len(many) - len(few), 19)
+        self.assertFalse(any(
+            'UPDATE "posts_post"' in sql and 'COUNT(' in sql
+            for sql in many))
+
+
+class GenerateDataCommandTest(TestCase):
+    OPTIONS = {
+        'users': 20, 'groups': 3, 'posts': 60, 'comments': 40,
+        'follows': 30, 'seed': 7, 'batch_size': 25, 'stdout': StringIO(),
+    }
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('id').values_list(
+                'text', 'author__username', 'group__slug')),
+            list(Follow.objects.order_by('id').values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_generates_requested_rows(self):
+        """generate_data создаёт данные, счётчики и ленты подписок"""
+        call_command('generate_data', **self.OPTIONS)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            follow.user.timeline.filter(author=follow.author).count(),
+            follow.author.posts.count(),
+        )
+        author_stats = AuthorStats.objects.get(user=follow.author)
+        self.assertEqual(
+            author_stats.posts_count, follow.author.posts.count())
+        post = Comment.objects.first().post
+        self.assertEqual(post.comments_count, post.comments.count())
+        self.assertEqual(post.last_comment, post.comments.first())
+
+    def test_same_seed_gives_same_data(self):
+        """Одинаковый seed даёт одинаковые данные"""
+        call_command('generate_data', **self.OPTIONS)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command('generate_data', **self.OPTIONS)
+        self.assertEqual(self.snapshot(), first)
+
+
+class BulkDeletionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='-')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.reader)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Спам {i}')
+            for i in range(5)
+        ]
+        cls.reader_post = Post.objects.create(
+            author=cls.reader, group=cls.group, text='Пост читателя')
+        cls.reader_comment = Comment.objects.create(
+            post=cls.reader_post, author=cls.reader, text='Свой')
+        for post in cls.posts[:3]:
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий')
+            Comment.objects.create(
+                post=cls.reader_post, author=cls.author, text='Спам')
+
+    def setUp(self):
+        self.progress = []
+
+    def report(self, label, total):
+        self.progress.append((label, total))
+
+    def test_delete_user(self):
+        """Пользователь удаляется порциями со всеми зависимостями,
+        счётчики и ленты остальных пользователей пересчитываются"""
+        BulkDeletion(chunk_size=2, report=self.report).delete_user(
+            User.objects.get(username='author'))
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertFalse(Post.objects.filter(text__startswith='Спам'))
+        self.assertFalse(Comment.objects.filter(text__in=(
+            'Спам', 'Комментарий')).exists())
+        self.assertFalse(
+            BulkDeletionTest.reader.timeline.exclude(
+                author=BulkDeletionTest.reader).exists())
+        self.assertEqual(search_posts('Спам').count(), 0)
+        reader_post = Post.objects.get(pk=BulkDeletionTest.reader_post.pk)
+        self.assertEqual(reader_post.comments_count, 1)
+        self.assertEqual(
+            reader_post.last_comment, BulkDeletionTest.reader_comment)
+        stats = AuthorStats.objects.get(user=BulkDeletionTest.reader)
+        self.assertEqual(
+            (stats.posts_count, stats.comments_count,
+             stats.followers_count, stats.following_count),
+            (1, 1, 0, 0),
+        )
+        self.assertIn(('Комментарии', 2), self.progress)
+        self.assertIn(('Посты', 5), self.progress)
+
+    def test_resume_after_interruption(self):
+        """Прерванное удаление продолжается повторным запуском"""
+        def interrupt(label, total):
+            if label == 'Посты':
+                raise KeyboardInterrupt
+
+        author = User.objects.get(username='author')
+        with self.assertRaises(KeyboardInterrupt):
+            BulkDeletion(chunk_size=2, report=interrupt).delete_user(author)
+        self.assertEqual(Post.objects.filter(author=author).count(), 3)
+        BulkDeletion(chunk_size=2).delete_user(author)
+        self.assertFalse(User.objects.filter(username='author').exists())
+
+    def test_delete_group(self):
+        """Посты удалённой группы остаются без группы"""
+        BulkDeletion(chunk_size=2).delete_group(
+            Group.objects.get(slug='test-slug'))
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(Post.objects.filter(group__isnull=True).count(), 6)
+
+    def test_command(self):
+        """bulk_delete удаляет посты и показывает прогресс"""
+        out = StringIO()
+        call_command(
+            'bulk_delete', post=[BulkDeletionTest.posts[0].pk],
+            chunk_size=1, stdout=out,
+        )
+        self.assertFalse(
+            Post.objects.filter(pk=BulkDeletionTest.posts[0].pk).exists())
+        self.assertIn('Комментарии: 1', out.getvalue())
+        self.assertIn('Удалено постов: 1.', out.getvalue())
+        post = Post.objects.get(pk=BulkDeletionTest.reader_post.pk)
+        self.assertEqual(post.comments_count, 4)
+
+    def test_admin_action(self):
+        """Действие админки удаляет выбранных пользователей порциями"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        author = User.objects.get(username='author')
+        response = client.post(
+            reverse('admin:auth_user_changelist'),
+            {'action': 'delete_in_chunks', ACTION_CHECKBOX_NAME: [author.pk]},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.filter(username='author').exists())
+
+    @override_settings(BULK_DELETE_ADMIN_CHUNKS=1)
+    def test_admin_action_chunk_limit(self):
+        """Действие админки удаляет не больше BULK_DELETE_ADMIN_CHUNKS
+        порций и предлагает продолжить"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        author = User.objects.get(username='author')
+        response = client.post(
+            reverse('admin:auth_user_changelist'),
+            {'action': 'delete_in_chunks', ACTION_CHECKBOX_NAME: [author.pk]},
+            follow=True,
+        )
+        self.assertContains(response, 'Удалено не всё')
+        self.assertFalse(Comment.objects.filter(author=author).exists())
+        self.assertEqual(Post.objects.filter(author=author).count(), 5)
+        BulkDeletion().delete_user(author)
+        self.assertFalse(User.objects.filter(username='author').exists())
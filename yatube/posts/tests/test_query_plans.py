@@ -0,0 +1,100 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный просмотр таблицы без индекса или сортировка во временном B-дереве.
+# До SQLite 3.36 полный просмотр выводится как SCAN TABLE <таблица>.
+BAD_PLAN = re.compile(r'^SCAN( TABLE)? \w+$|TEMP B-TREE')
+
+
+class QueryPlanTest(TestCase):
+    """EXPLAIN QUERY PLAN для всех запросов, которые делают ленты."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='user_author')
+        cls.reader = User.objects.create_user(username='user_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Text-{i}')
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Comment-{i}')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(QueryPlanTest.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.reader_client.get(url)
+            page_obj = (
+                response.context and response.context.get('page_obj'))
+            if page_obj and page_obj.paginator.next_cursor:
+                self.reader_client.get(
+                    url, {'cursor': page_obj.paginator.next_cursor})
+        for query in context.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            plan = self.explain(query['sql'])
+            bad_steps = [step for step in plan if BAD_PLAN.search(step)]
+            self.assertEqual(
+                bad_steps, [], f'{url}: {query["sql"]}\n{plan}')
+
+    def test_feed_query_plans(self):
+        """Ленты читаются по индексам без полного просмотра и сортировки"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    kwargs={'slug': QueryPlanTest.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': QueryPlanTest.author.username}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_plans(url)
+
+    def test_post_detail_query_plans(self):
+        """Страница поста и её комментарии читаются по индексам"""
+        self.assert_plans(reverse(
+            'posts:post_detail', kwargs={'post_id': QueryPlanTest.post.id}))
+
+    @override_settings(COMMENTS_IN_PAGE=1)
+    def test_comment_pages_query_plans(self):
+        """Следующие страницы комментариев читаются по индексу"""
+        post = QueryPlanTest.post
+        for i in range(2):
+            Comment.objects.create(
+                post=post, author=QueryPlanTest.author, text=f'Ответ-{i}')
+        response = self.reader_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.id}))
+        cursor = response.context['comments'].paginator.next_cursor
+        self.assert_plans(reverse(
+            'posts:post_comments', kwargs={'post_id': post.id}
+        ) + f'?cursor={cursor}')
+
+    def test_group_choices_query_plans(self):
+        """Подбор групп читает индекс по названию"""
+        self.assert_plans(reverse('posts:group_choices') + '?q=тест')
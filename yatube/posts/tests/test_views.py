@@ -1,15 +1,27 @@
+import os
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, Client, TransactionTestCase
+from django.test import override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post, Comment, Follow
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+
+from ..feed_cache import GROUPS_FEED, INDEX_FEED, feed_versions
+from ..forms import PostForm
+from ..groups import find_groups
+from ..models import Group, Post, Comment, Follow, TimelineEntry
 from ..urls import app_name
 
 
@@ -116,7 +128,10 @@ class PostViewsPaginatorTest(TestCase):
             self.all_templates_with_paginator_and_posts_count.items()
         ):
             with self.subTest(reverse_name=reverse_name):
-                response = self.authorized_author.get(reverse_name + '?page=2')
+                first_page = self.authorized_author.get(reverse_name)
+                paginator = first_page.context['page_obj'].paginator
+                response = self.authorized_author.get(
+                    reverse_name, {'cursor': paginator.next_cursor})
                 if response.status_code == 200:
                     expected_posts_count = 0
                     if posts_count - self.posts_per_page > self.posts_per_page:
@@ -129,6 +144,54 @@ class PostViewsPaginatorTest(TestCase):
                         len(response.context['page_obj']), expected_posts_count
                     )
 
+    def test_paginator_cursor_navigation(self):
+        """Тест переходов вперёд и назад по курсору паджинатора."""
+        first_page = self.authorized_author.get(reverse('posts:index'))
+        page_obj = first_page.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+        second_page = self.authorized_author.get(
+            reverse('posts:index'),
+            {'cursor': page_obj.paginator.next_cursor},
+        )
+        second_obj = second_page.context['page_obj']
+        self.assertEqual(second_obj.number, 2)
+        self.assertFalse(second_obj.has_next())
+        self.assertEqual(
+            [post.text for post in second_obj],
+            [f'Text-{i}' for i in range(5, 0, -1)],
+        )
+
+        back_page = self.authorized_author.get(
+            reverse('posts:index'),
+            {'cursor': second_obj.paginator.previous_cursor},
+        )
+        self.assertEqual(
+            list(back_page.context['page_obj']), list(page_obj)
+        )
+        self.assertEqual(back_page.context['page_obj'].number, 1)
+
+    def test_paginator_bad_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.authorized_author.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_paginator_cursor_from_other_feed(self):
+        """Курсор поиска в ленте открывает её первую страницу"""
+        response = self.authorized_author.get(
+            reverse('posts:search'), {'q': 'Text'})
+        cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertIsNotNone(cursor)
+        for url in self.all_templates_with_paginator_and_posts_count:
+            with self.subTest(url=url):
+                response = self.authorized_author.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page_obj'].number, 1)
+
 
 class PostViewsContextTest(TestCase):
     @classmethod
@@ -349,9 +412,191 @@ class PostViewsImageTest(TestCase):
             id=last_post.id,
             text=form_data['text'],
             group=form_data['group'],
-            image=f'{app_name}/{form_data["image"].name}',
+            image__startswith=f'{app_name}/',
         ).exists()
         )
+        self.assertTrue(
+            ContentAddressedStorage.is_hashed(last_post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPregenerationTest(TransactionTestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user_author')
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user,
+            text='Текст',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=self.small_gif,
+                content_type='image/gif',
+            ),
+        )
+
+    def get_detail(self, post):
+        return self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        ).content.decode()
+
+    def test_thumbnail_ready_after_upload(self):
+        """Миниатюра готовится при сохранении поста, а не при чтении"""
+        post = self.create_post()
+        content = self.get_detail(post)
+        self.assertIn(settings.MEDIA_URL + 'cache/', content)
+        self.assertNotIn('data:image/svg+xml', content)
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюра не готова, страница отдаёт заглушку"""
+        with transaction.atomic():
+            post = self.create_post()
+            content = self.get_detail(post)
+        self.assertIn('data:image/svg+xml', content)
+        self.assertNotIn(settings.MEDIA_URL + 'cache/', content)
+        self.assertIn(
+            settings.MEDIA_URL + 'cache/', self.get_detail(post))
+
+    def test_feed_resolves_thumbnails_in_one_query(self):
+        """Миниатюры страницы ленты читаются одним запросом к базе"""
+        for _ in range(3):
+            self.create_post()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            content = self.client.get(reverse('posts:index')).content
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(
+            content.decode().count(f'src="{settings.MEDIA_URL}cache/'), 3)
+
+    @override_settings(THUMBNAIL_MODERN_FORMATS=('PNG', 'NOPE'))
+    def test_srcset_and_sources(self):
+        """Картинка выводится с srcset из всех ширин и <source> для
+        дополнительных форматов, которые умеет Pillow"""
+        self.create_post()
+        content = self.client.get(reverse('posts:index')).content.decode()
+        for width in (320, 640, 960):
+            self.assertRegex(content, rf'srcset="[^"]*\.jpg {width}w')
+            self.assertRegex(content, rf'srcset="[^"]*\.png {width}w')
+        self.assertIn('<source type="image/png"', content)
+        self.assertNotIn('NOPE', content)
+        self.assertIn(
+            f'sizes="{settings.THUMBNAIL_SRCSET["post"]["sizes"]}"', content)
+
+    def test_feed_placeholder_replaced_when_ready(self):
+        """Фрагмент ленты с заглушкой не берётся из кеша, когда миниатюра
+        готова: заглушки входят в ключ фрагмента"""
+        with transaction.atomic():
+            self.create_post()
+            content = self.client.get(reverse('posts:index')).content
+        self.assertIn(b'data:image/svg+xml', content)
+        content = self.client.get(reverse('posts:index')).content
+        self.assertNotIn(b'data:image/svg+xml', content)
+        self.assertIn((settings.MEDIA_URL + 'cache/').encode(), content)
+
+    def assert_no_validators_with_placeholder(self, url):
+        with transaction.atomic():
+            post = self.create_post()
+            response = self.client.get(url(post))
+        self.assertContains(response, 'data:image/svg+xml')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertTrue(self.client.get(url(post)).has_header('ETag'))
+
+    def test_post_detail_no_validators_with_placeholder(self):
+        """Страница поста с заглушкой отдаётся без ETag и Last-Modified"""
+        self.assert_no_validators_with_placeholder(lambda post: reverse(
+            'posts:post_detail', kwargs={'post_id': post.id}))
+
+    def test_feed_no_validators_with_placeholder(self):
+        """Лента с заглушкой отдаётся без ETag"""
+        self.assert_no_validators_with_placeholder(
+            lambda post: reverse('posts:index'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaStorageTest(TransactionTestCase):
+    small_gif = ThumbnailPregenerationTest.small_gif
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user_author')
+
+    def create_post(self, name='meme.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='Текст',
+            image=SimpleUploadedFile(name, self.small_gif),
+        )
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом, пока на него есть
+        ссылки"""
+        first = self.create_post('meme.gif')
+        second = self.create_post('copy.gif')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(
+            name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 2)
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_upload_while_released(self):
+        """Файл не удаляется, если его загрузили снова до того, как
+        освободившая его транзакция зафиксирована"""
+        first = self.create_post('meme.gif')
+        path = first.image.path
+        with transaction.atomic():
+            first.delete()
+            second = self.create_post('copy.gif')
+        self.assertEqual(second.image.path, path)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(
+            StoredFile.objects.get(name=second.image.name).refs, 1)
+
+    def test_migrate_media(self):
+        """migrate_media переносит старые файлы в хранилище по содержимому"""
+        legacy = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'legacy.gif')
+        os.makedirs(os.path.dirname(legacy), exist_ok=True)
+        with open(legacy, 'wb') as file:
+            file.write(self.small_gif)
+        post = Post.objects.create(
+            author=self.user, text='Текст', image='posts/legacy.gif')
+        call_command('migrate_media', stdout=open(os.devnull, 'w'))
+        post.refresh_from_db()
+        self.assertTrue(ContentAddressedStorage.is_hashed(post.image.name))
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertFalse(os.path.exists(legacy))
+        self.assertEqual(StoredFile.objects.get(name=post.image.name).refs, 1)
 
 
 class CommentsViewsTest(TestCase):
@@ -408,17 +653,106 @@ class CommentsViewsTest(TestCase):
             post=CommentsViewsTest.post.id).order_by('-created')[0]
         self.assertEqual(last_comment.text, form_data['text'])
 
+    @override_settings(COMMENTS_IN_PAGE=2)
+    def test_comments_paginated(self):
+        """На странице поста первая страница комментариев, остальные
+        отдаёт фрагмент по курсору"""
+        post = CommentsViewsTest.post
+        for i in range(5):
+            Comment.objects.create(
+                post=post, author=CommentsViewsTest.user, text=f'Номер {i}')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments], ['Номер 4', 'Номер 3'])
+        url = reverse('posts:post_comments', kwargs={'post_id': post.id})
+        self.assertContains(response, f'{url}?cursor=')
+        texts = []
+        cursor = comments.paginator.next_cursor
+        while cursor:
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateNotUsed(response, 'base.html')
+            texts += [comment.text for comment in response.context['comments']]
+            cursor = response.context['comments'].paginator.next_cursor
+        self.assertEqual(texts, ['Номер 2', 'Номер 1', 'Номер 0'])
+        self.assertNotContains(response, 'comments-more')
+
+    def test_comments_fragment_missing_post(self):
+        """Фрагмент комментариев несуществующего поста — 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_preview_in_feeds(self):
+        """В лентах число комментариев и последний комментарий поста,
+        число запросов от комментариев не зависит"""
+        post = CommentsViewsTest.post
+        url = reverse('posts:index')
+        cache.clear()
+        with CaptureQueriesContext(connection) as without_comments:
+            self.client.get(url)
+        for i in range(3):
+            Comment.objects.create(
+                post=post, author=CommentsViewsTest.user, text=f'Номер {i}')
+        cache.clear()
+        with CaptureQueriesContext(connection) as with_comments:
+            response = self.client.get(url)
+        self.assertEqual(len(with_comments), len(without_comments))
+        self.assertContains(response, 'Комментариев: 3')
+        self.assertContains(response, 'Номер 2')
+        self.assertNotContains(response, 'Номер 1')
+        for name, kwargs in (
+            ('posts:group_list', {'slug': CommentsViewsTest.group.slug}),
+            ('posts:profile', {'username': CommentsViewsTest.user.username}),
+        ):
+            with self.subTest(name=name):
+                self.assertContains(
+                    self.client.get(reverse(name, kwargs=kwargs)), 'Номер 2')
+
+    def test_comment_keeps_feed_versions(self):
+        """Комментарий меняет фрагмент только своей страницы и ETag
+        ленты, версии лент не сбрасываются"""
+        url = reverse('posts:index')
+        first = self.client.get(url)
+        versions = feed_versions(INDEX_FEED, GROUPS_FEED)
+        Comment.objects.create(
+            post=CommentsViewsTest.post, author=CommentsViewsTest.user,
+            text='Свежий комментарий')
+        self.assertEqual(feed_versions(INDEX_FEED, GROUPS_FEED), versions)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Свежий комментарий')
+
     def test_cache(self):
-        """Тест корректной работы кеширования, после удаления поста
-        содержимое response.content у 1 и 2 запростов должны быть разными"""
+        """Тест корректной работы кеширования: пока лента не меняется,
+        отдаётся закешированный фрагмент, удаление поста сбрасывает кеш"""
         new_post = Post.objects.create(
             author=CommentsViewsTest.user,
             text='Text12345',
         )
         first_response = self.client.get(reverse('posts:index'))
-        new_post.delete()
+        Post.objects.filter(id=new_post.id).update(text='Text54321')
         second_response = self.client.get(reverse('posts:index'))
         self.assertEqual(first_response.content, second_response.content)
+        new_post.delete()
+        third_response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Text12345', third_response.content.decode())
+
+    def test_cache_varies_by_page(self):
+        """Закешированная первая страница не отдаётся вместо второй"""
+        for i in range(12):
+            Post.objects.create(
+                author=CommentsViewsTest.user, text=f'Page-text-{i}')
+        first_page = self.client.get(reverse('posts:index'))
+        second_page = self.client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.context['page_obj'].paginator.next_cursor},
+        )
+        self.assertIn('Page-text-11', first_page.content.decode())
+        self.assertNotIn('Page-text-0', first_page.content.decode())
+        self.assertNotIn('Page-text-11', second_page.content.decode())
+        self.assertIn('Page-text-0', second_page.content.decode())
 
 
 class FollowViewsTest(TestCase):
@@ -462,6 +796,33 @@ class FollowViewsTest(TestCase):
             user=form_data['user']).filter(author=form_data['author']).exists()
         self.assertTrue(is_you_follow)
 
+    def test_follow_concurrent_click(self):
+        """Тест: повторная подписка из параллельного запроса не даёт 500"""
+        Follow.objects.create(
+            user=FollowViewsTest.user_follower,
+            author=FollowViewsTest.vasia_author,
+        )
+        url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': FollowViewsTest.vasia_author.username}
+        )
+        with mock.patch.object(
+            Follow.objects, 'get_or_create', side_effect=IntegrityError
+        ):
+            response = self.authorized_author.post(url)
+        self.assertRedirects(
+            response,
+            reverse('posts:profile',
+                    kwargs={'username': FollowViewsTest.vasia_author.username})
+        )
+        self.assertEqual(
+            Follow.objects.filter(
+                user=FollowViewsTest.user_follower,
+                author=FollowViewsTest.vasia_author,
+            ).count(),
+            1
+        )
+
     def test_unfollow(self):
         """Тест отписки от автора"""
         form_data = {
@@ -505,3 +866,246 @@ class FollowViewsTest(TestCase):
             author__following__author=FollowViewsTest.vasia_author
         ).exists()
         self.assertFalse(is_post_in_follow_list)
+
+    def test_timeline_fan_out_and_prune(self):
+        """Тест: новый пост попадает в ленту подписчика,
+        после отписки посты автора из ленты удаляются."""
+        self.authorized_author.get(
+            reverse(
+                'posts:profile_follow',
+                kwargs={'username': FollowViewsTest.vasia_author.username}
+            )
+        )
+        new_post = Post.objects.create(
+            author=FollowViewsTest.vasia_author,
+            text='Text3',
+        )
+        response = self.authorized_author.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=FollowViewsTest.user_not_follower).exists())
+
+        self.authorized_author.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': FollowViewsTest.vasia_author.username}
+            )
+        )
+        response = self.authorized_author.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Text',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившиеся страницы отдаются с кодом 304"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('ETag'))
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        """Новый пост и новый комментарий меняют ETag"""
+        index_url = reverse('posts:index')
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id})
+        index_etag = self.client.get(index_url)['ETag']
+        detail_etag = self.client.get(detail_url)['ETag']
+        Post.objects.create(author=self.user, text='Text2')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        response = self.client.get(index_url, HTTP_IF_NONE_MATCH=index_etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user_author')
+        cls.other = User.objects.create_user(username='other_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.best = Post.objects.create(
+            author=cls.user, group=cls.group, text='Котики котики котики')
+        cls.weak = Post.objects.create(
+            author=cls.other, text='Про котиков и собак, и ещё много слов')
+        Post.objects.create(author=cls.user, text='Только собаки')
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_search_ranks_results(self):
+        """Поиск находит посты по префиксу слова и ранжирует их"""
+        self.assertEqual(
+            self.search(q='КОТИК'), [SearchViewTest.best, SearchViewTest.weak])
+        self.assertEqual(self.search(q='"; DROP'), [])
+
+    def test_search_filters(self):
+        """Поиск фильтруется по группе и автору"""
+        self.assertEqual(
+            self.search(q='котик', group=SearchViewTest.group.slug),
+            [SearchViewTest.best],
+        )
+        self.assertEqual(
+            self.search(q='котик', author=SearchViewTest.other.username),
+            [SearchViewTest.weak],
+        )
+
+    def test_search_form_does_not_list_groups(self):
+        """Группа в форме поиска вводится слагом, без списка всех групп"""
+        Group.objects.create(title='Другая группа', slug='other-slug')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('posts:search'),
+                {'q': 'котик', 'group': SearchViewTest.group.slug},
+            )
+        self.assertNotContains(response, '<option')
+        self.assertContains(response, 'value="test-slug"')
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'posts_group' in query['sql'] and 'WHERE' not in query['sql']
+        ])
+
+    def test_search_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.create(author=SearchViewTest.user, text='Ежик')
+        self.assertEqual(self.search(q='ежик'), [post])
+        post.text = 'Белка'
+        post.save()
+        self.assertEqual(self.search(q='ежик'), [])
+        self.assertEqual(self.search(q='белка'), [post])
+        post.delete()
+        self.assertEqual(self.search(q='белка'), [])
+
+    @override_settings(POSTS_IN_PAGE=1)
+    def test_search_cursor_keeps_query(self):
+        """Ссылки паджинатора поиска сохраняют запрос"""
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [SearchViewTest.best])
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'котик', 'cursor': next_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         [SearchViewTest.weak])
+
+
+class GroupChoicesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user_author')
+        cls.groups = [
+            Group.objects.create(
+                title=title, slug=f'slug-{i}', description='Описание')
+            for i, title in enumerate(
+                ('Мотоциклы', 'Моторные лодки', 'Котики'))
+        ]
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.groups[2], text='Text')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(GroupChoicesTest.user)
+
+    def titles(self, q):
+        response = self.authorized_client.get(
+            reverse('posts:group_choices'), {'q': q})
+        return [group['title'] for group in response.json()['results']]
+
+    def test_prefix_search(self):
+        """Группы ищутся по началу названия, первая буква —
+        без учёта регистра"""
+        self.assertEqual(self.titles('мото'), ['Моторные лодки', 'Мотоциклы'])
+        self.assertEqual(self.titles('Мотоц'), ['Мотоциклы'])
+        self.assertEqual(self.titles('лодки'), [])
+        self.assertEqual(
+            self.titles(''), ['Котики', 'Моторные лодки', 'Мотоциклы'])
+
+    @override_settings(GROUP_CHOICES_LIMIT=1)
+    def test_limit(self):
+        """Ответ ограничен GROUP_CHOICES_LIMIT группами"""
+        self.assertEqual(self.titles('мото'), ['Моторные лодки'])
+
+    def test_login_required(self):
+        """Подбор групп доступен только после входа"""
+        response = self.client.get(
+            reverse('posts:group_choices'), {'q': 'мото'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_cached_until_groups_change(self):
+        """Ответ для короткого префикса берётся из кеша, пока группы
+        не меняются"""
+        find_groups('мот')
+        with self.assertNumQueries(0):
+            find_groups('мот')
+        Group.objects.create(
+            title='Мотокросс', slug='motocross', description='Описание')
+        self.assertIn('Мотокросс', self.titles('мот'))
+
+    @override_settings(GROUP_CHOICES_MAX_PREFIX=4)
+    def test_long_prefix_cut_and_not_cached(self):
+        """Длинный префикс обрезается, и ответ для него не кешируется"""
+        self.assertEqual(
+            self.titles('мото' + 'z' * 100), ['Моторные лодки', 'Мотоциклы'])
+        for _ in range(2):
+            with self.assertNumQueries(2):
+                find_groups('Мотоц')
+
+    def test_form_renders_only_selected_group(self):
+        """Форма поста не выводит все группы, только выбранную"""
+        response = self.authorized_client.get(reverse('posts:post_create'))
+        self.assertNotContains(response, 'Мотоциклы')
+        self.assertContains(
+            response, f'data-choices-url="{reverse("posts:group_choices")}"')
+        field = PostForm(instance=GroupChoicesTest.post)['group']
+        self.assertIn('Котики', str(field))
+        self.assertNotIn('Мотоциклы', str(field))
+
+    def test_form_accepts_any_group(self):
+        """Группа, которой не было на странице формы, принимается"""
+        group = GroupChoicesTest.groups[0]
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Про мотоциклы', 'group': group.id},
+        )
+        self.assertTrue(
+            Post.objects.filter(text='Про мотоциклы', group=group).exists())
@@ -0,0 +1,269 @@
+"""Миниатюры картинок постов готовятся в фоне, а не в запросе читателя.
+
+Наборы миниатюр для srcset описаны в settings.THUMBNAIL_SRCSET: несколько
+ширин в основном формате и в каждом из THUMBNAIL_MODERN_FORMATS, который
+умеет сохранять Pillow. После сохранения поста с новой картинкой все они
+ставятся в очередь пула потоков. Тег {% resolve_thumbnails %} только
+читает готовые миниатюры из хранилища sorl, для всей страницы ленты
+разом (один get_many к кешу и один запрос к базе), и кладёт в
+post.thumbnail ResponsiveImage, а пока миниатюр нет, лёгкую заглушку.
+Тот же пул удаляет освобождённые картинки вместе с их миниатюрами.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image
+from sorl.thumbnail import base, default, delete
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = set()
+_executor = None
+_executor_pid = None
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def get_many(self, image_files):
+        """Как get для списка картинок, но одним get_many к кешу и одним
+        запросом к базе для того, чего нет в кеше."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            fresh = {
+                key: found.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            self.cache.set_many(
+                fresh, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fresh)
+        return [
+            None if values[key] == cached_db_kvstore.EMPTY_VALUE
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    def get_ready_thumbnails(self, requests):
+        """Как get_thumbnail для списка (картинка, геометрия, опции), но
+        без генерации: None вместо миниатюры, которой ещё нет."""
+        thumbnails = []
+        for file_, geometry_string, options in requests:
+            source = ImageFile(file_)
+            name = self._get_thumbnail_filename(
+                source, geometry_string,
+                self.thumbnail_options(source, options),
+            )
+            thumbnails.append(ImageFile(name, default.storage))
+        return default.kvstore.get_many(thumbnails)
+
+    def thumbnail_options(self, source, options):
+        """Опции по умолчанию так же, как в get_thumbnail sorl."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+
+class ResponsiveImage:
+    """Готовые миниатюры картинки для <picture>.
+
+    url, width и height относятся к самой большой миниатюре основного
+    формата, sources описывают <source> для остальных форматов.
+    """
+
+    is_placeholder = False
+
+    def __init__(self, thumbnails, sizes):
+        fallback = thumbnails.pop(None)
+        self.url = fallback[-1].url
+        self.width = fallback[-1].width
+        self.height = fallback[-1].height
+        self.srcset = _srcset(fallback)
+        self.sizes = sizes
+        self.sources = [
+            {'type': Image.MIME[image_format], 'srcset': _srcset(images)}
+            for image_format, images in thumbnails.items()
+        ]
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in thumbnails)
+
+
+class Placeholder:
+    """Заглушка вместо миниатюры, которая ещё готовится."""
+
+    is_placeholder = True
+    srcset = ''
+    sizes = ''
+    sources = ()
+
+    def __init__(self, geometry):
+        width, height = parse_geometry(geometry)
+        self.width = width or height
+        self.height = height or width
+        self.url = 'data:image/svg+xml,' + quote(
+            "<svg xmlns='http://www.w3.org/2000/svg' "
+            f"width='{self.width}' height='{self.height}'>"
+            "<rect width='100%' height='100%' fill='#e9ecef'/></svg>"
+        )
+
+
+def modern_formats():
+    """Форматы из THUMBNAIL_MODERN_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.THUMBNAIL_MODERN_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def variants(preset):
+    """(формат, геометрия, опции) всех миниатюр набора от меньшей к
+    большей; формат None означает основной формат sorl."""
+    config = settings.THUMBNAIL_SRCSET[preset]
+    for image_format in (None, *modern_formats()):
+        options = dict(config['options'])
+        if image_format is not None:
+            options['format'] = image_format
+        for geometry in config['geometries']:
+            yield image_format, geometry, options
+
+
+def attach_thumbnails(posts, preset):
+    """Кладёт в post.thumbnail миниатюры набора preset для всех постов,
+    найденные разом; недостающие ставятся в очередь."""
+    if isinstance(posts, Post):
+        posts = [posts]
+    with_images = [post for post in posts if post.image]
+    preset_variants = list(variants(preset))
+    thumbnails = iter(default.backend.get_ready_thumbnails(
+        (post.image.name, geometry, options)
+        for post in with_images
+        for _, geometry, options in preset_variants
+    ))
+    config = settings.THUMBNAIL_SRCSET[preset]
+    for post in with_images:
+        ready = {}
+        missing = False
+        for (image_format, _, _), thumbnail in zip(
+                preset_variants, thumbnails):
+            if thumbnail is None:
+                missing = True
+            else:
+                ready.setdefault(image_format, []).append(thumbnail)
+        if missing:
+            queue_thumbnails(post.image.name)
+        if None in ready:
+            post.thumbnail = ResponsiveImage(ready, config['sizes'])
+        else:
+            post.thumbnail = Placeholder(config['geometries'][-1])
+
+
+def has_placeholders(posts):
+    """Есть ли среди постов с разрешёнными миниатюрами заглушки."""
+    if isinstance(posts, Post):
+        posts = [posts]
+    return any(
+        getattr(getattr(post, 'thumbnail', None), 'is_placeholder', False)
+        for post in posts
+    )
+
+
+def queue_thumbnails(name):
+    """Готовит все миниатюры картинки в фоне после фиксации транзакции.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры готовятся сразу в текущем потоке.
+    """
+    transaction.on_commit(lambda: _submit(name))
+
+
+def _submit(name):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _run_in_worker(generate_thumbnails, name)
+
+
+def queue_cleanup(name):
+    """Удаляет освобождённую картинку и её миниатюры в фоне после
+    фиксации транзакции (см. ContentAddressedStorage.release)."""
+    transaction.on_commit(lambda: _run_in_worker(_cleanup, name))
+
+
+def _cleanup(name):
+    try:
+        if Post._meta.get_field('image').storage.delete_released(name):
+            delete(name, delete_file=False)
+    except Exception:
+        logger.exception('Не удалось удалить миниатюры %s', name)
+
+
+def _run_in_worker(func, *args):
+    if not settings.THUMBNAIL_WORKERS:
+        # Свой поток — своё соединение: как и у пула, эти запросы не
+        # засчитываются странице, которая их вызвала.
+        worker = threading.Thread(target=_in_worker, args=(func, *args))
+        worker.start()
+        worker.join()
+        return
+    _get_executor().submit(_in_worker, func, *args)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _in_worker(func, *args):
+    try:
+        func(*args)
+    finally:
+        connections.close_all()
+
+
+def generate_thumbnails(name):
+    """Сразу готовит все миниатюры картинки из THUMBNAIL_SRCSET."""
+    try:
+        for preset in settings.THUMBNAIL_SRCSET:
+            for _, geometry, options in variants(preset):
+                default.backend.get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
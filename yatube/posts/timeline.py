@@ -0,0 +1,53 @@
+from django.conf import settings
+
+from .models import Follow, Post, TimelineEntry
+
+
+def fan_out_post(post):
+    """Кладёт пост в ленты всех подписчиков его автора."""
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    entries = (
+        TimelineEntry(
+            user_id=follower_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for follower_id in follower_ids.iterator()
+    )
+    _bulk_insert(entries)
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту подписчика уже написанные посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    entries = (
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+    _bulk_insert(entries)
+
+
+def prune_timeline(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def _bulk_insert(entries):
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
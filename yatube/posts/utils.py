@@ -1,9 +1,136 @@
-from django.core.paginator import Paginator
+from datetime import datetime
+
 from django.conf import settings
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'posts.cursor'
+DEFAULT_KEYS = ('-pub_date', '-id')
+COMMENT_KEYS = ('-created', '-id')
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (по умолчанию (pub_date, id)) от новых к старым.
+
+    Вместо COUNT(*) и OFFSET страница выбирается условием на ключ
+    последнего показанного объекта, поэтому любая страница стоит
+    столько же, сколько первая. Номер страницы и общее число объектов
+    известны только относительно текущей страницы.
+
+    keys задаёт порядок как в order_by: '-' перед полем означает
+    сортировку по убыванию. Курсоры подписываются вместе с keys, поэтому
+    курсор другой ленты не подходит и открывает первую страницу.
+    """
+
+    def __init__(self, object_list, per_page, keys=DEFAULT_KEYS):
+        self.keys = keys
+        self.salt = f'{CURSOR_SALT}:{",".join(keys)}'
+        self.aliases = [f'keyset_{i}' for i in range(len(keys))]
+        self.descending = [key.startswith('-') for key in keys]
+        object_list = object_list.annotate(**{
+            alias: F(key.lstrip('-'))
+            for alias, key in zip(self.aliases, keys)
+        }).order_by(*(
+            f'-{alias}' if descending else alias
+            for alias, descending in zip(self.aliases, self.descending)
+        ))
+        super().__init__(object_list, per_page)
+        self.number = 1
+        self.items = []
+        self.has_next = False
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @cached_property
+    def count(self):
+        return (
+            (self.number - 1) * self.per_page
+            + len(self.items) + int(self.has_next)
+        )
+
+    @cached_property
+    def num_pages(self):
+        return self.number + int(self.has_next)
+
+    def get_page(self, cursor=None):
+        direction, values, number = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if direction == 'prev':
+            queryset = queryset.reverse()
+        if values is not None:
+            queryset = queryset.filter(self.seek(direction, values))
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if direction == 'prev':
+            items.reverse()
+            self.has_next = True
+            number = max(number, 2) if has_more else 1
+        else:
+            self.has_next = has_more
+        self.number = number
+        self.items = items
+        if items and self.has_next:
+            self.next_cursor = self.encode_cursor(
+                'next', items[-1], number + 1)
+        if items and number > 1:
+            self.previous_cursor = self.encode_cursor(
+                'prev', items[0], number - 1)
+        return Page(items, number, self)
+
+    def seek(self, direction, values):
+        lookups = [
+            'lt' if descending == (direction == 'next') else 'gt'
+            for descending in self.descending
+        ]
+        condition = Q()
+        for i in reversed(range(len(self.aliases))):
+            step = Q(**{f'{self.aliases[i]}__{lookups[i]}': values[i]})
+            if i < len(self.aliases) - 1:
+                step |= Q(**{self.aliases[i]: values[i]}) & condition
+            condition = step
+        first = self.aliases[0]
+        return Q(**{f'{first}__{lookups[0]}e': values[0]}) & condition
+
+    def encode_cursor(self, direction, item, number):
+        values = [
+            _dump_value(getattr(item, alias)) for alias in self.aliases
+        ]
+        return signing.dumps([direction, values, number], salt=self.salt)
+
+    def decode_cursor(self, cursor):
+        first_page = 'next', None, 1
+        if not cursor:
+            return first_page
+        try:
+            direction, values, number = signing.loads(
+                cursor, salt=self.salt)
+            values = [_load_value(value) for value in values]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return first_page
+        if (direction not in ('next', 'prev')
+                or len(values) != len(self.keys) or None in values
+                or not isinstance(number, int) or number < 1):
+            return first_page
+        return direction, values, number
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        return parse_datetime(value['dt'])
+    return value
 
 
-def add_paginator(post_list, request):
-    paginator = Paginator(post_list, settings.POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def add_paginator(post_list, request, keys=DEFAULT_KEYS):
+    paginator = KeysetPaginator(post_list, settings.POSTS_IN_PAGE, keys=keys)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     return page_obj
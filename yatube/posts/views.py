@@ -1,45 +1,94 @@
+from functools import wraps
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.db import IntegrityError
+from django.views.decorators.http import condition
 
 from .models import Post, Group, User, Comment, Follow
-from .forms import PostForm, CommentForm
-from .utils import add_paginator
+from .forms import PostForm, CommentForm, SearchForm
+from .etags import (group_etag, index_etag, post_detail_etag,
+                    post_detail_last_modified, profile_etag)
+from .feed_cache import (INDEX_FEED, feed_cache_key, follow_feed, group_feed,
+                         profile_feed)
+from .groups import find_groups
+from .search import SEARCH_KEYS, search_posts
+from .stats import get_author_stats
+from .thumbnails import attach_thumbnails, has_placeholders
+from .utils import COMMENT_KEYS, KeysetPaginator, add_paginator
+
+
+def _validators_only_with_thumbnails(view):
+    """Убирает ETag и Last-Modified у страниц с заглушками миниатюр:
+    валидаторы не знают о готовности миниатюр, и клиент получал бы 304
+    с заглушкой и после того, как миниатюры готовы."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if getattr(response, 'has_placeholders', False):
+            del response['ETag']
+            del response['Last-Modified']
+        return response
+    return wrapper
+
 
+def _render_posts(request, template, context, posts):
+    response = render(request, template, context)
+    response.has_placeholders = has_placeholders(posts)
+    return response
 
+
+@_validators_only_with_thumbnails
+@condition(etag_func=index_etag)
 def index(request):
     template = 'posts/index.html/'
     title = "Последние обновления на сайте"
-    post_list = Post.objects.select_related('group', 'author').all()
+    post_list = Post.objects.select_related(
+        'group', 'author', 'last_comment__author').all()
     page_obj = add_paginator(post_list, request)
+    attach_thumbnails(page_obj, 'post')
     context = {
         'title': title,
         'page_obj': page_obj,
+        'feed_cache_key': feed_cache_key(INDEX_FEED, request, page_obj),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
-    return render(request, template, context)
+    return _render_posts(request, template, context, page_obj)
 
 
+@_validators_only_with_thumbnails
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     template = 'posts/group_list.html/'
     group = get_object_or_404(Group, slug=slug)
     post_list = Post.objects.select_related(
-        'group', 'author').filter(
+        'group', 'author', 'last_comment__author').filter(
         group=group)
     page_obj = add_paginator(post_list, request)
+    attach_thumbnails(page_obj, 'post')
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_cache_key': feed_cache_key(
+            group_feed(group.id), request, page_obj),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
-    return render(request, template, context)
+    return _render_posts(request, template, context, page_obj)
 
 
+@_validators_only_with_thumbnails
+@condition(etag_func=profile_etag)
 def profile(request, username):
     template = 'posts/profile.html/'
-    author = get_object_or_404(User, username=username)
-    # posts_count = Post.objects.filter(author=author).count()
-    post_list = Post.objects.select_related('group', 'author').filter(
-        author=author)
-    posts_count = len(post_list)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    stats = get_author_stats(author)
+    post_list = Post.objects.select_related(
+        'group', 'author', 'last_comment__author').filter(author=author)
     page_obj = add_paginator(post_list, request)
+    attach_thumbnails(page_obj, 'post')
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(user=request.user).filter(
@@ -47,30 +96,90 @@ def profile(request, username):
     context = {
         'author': author,
         'user': request.user,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
         'following': following,
+        'feed_cache_key': feed_cache_key(
+            profile_feed(author.id), request, page_obj),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
-    return render(request, template, context)
+    return _render_posts(request, template, context, page_obj)
 
 
+@_validators_only_with_thumbnails
+@condition(
+    etag_func=post_detail_etag,
+    last_modified_func=post_detail_last_modified,
+)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html/'
-    post = get_object_or_404(Post, id=post_id)
-    author = post.author
-    posts_count = Post.objects.filter(author=author).count()
+    post = get_object_or_404(
+        Post.objects.select_related('group', 'author__stats'), id=post_id)
+    stats = get_author_stats(post.author)
     form = CommentForm(request.POST or None)
-    post_comments = Comment.objects.filter(post=post_id).select_related(
-        'post', 'author')
     context = {
         'post': post,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
+        'form': form,
+        'comments': _comments_page(post.id, cursor=None),
+    }
+    return _render_posts(request, template, context, post)
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев: только их HTML для post_detail."""
+    template = 'posts/includes/comment_list.html'
+    comments = _comments_page(post_id, request.GET.get('cursor'))
+    if not comments and not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    return render(request, template, {
+        'post_id': post_id,
+        'comments': comments,
+    })
+
+
+def _comments_page(post_id, cursor):
+    paginator = KeysetPaginator(
+        Comment.objects.filter(post=post_id).select_related('author'),
+        settings.COMMENTS_IN_PAGE,
+        keys=COMMENT_KEYS,
+    )
+    return paginator.get_page(cursor)
+
+
+def search(request):
+    template = 'posts/search.html/'
+    form = SearchForm(request.GET or None)
+    post_list = Post.objects.none()
+    if form.is_valid():
+        post_list = search_posts(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+        )
+    page_obj = add_paginator(post_list, request, keys=SEARCH_KEYS)
+    context = {
         'form': form,
-        'comments': post_comments,
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@login_required
+def group_choices(request):
+    """Группы для поля формы поста по началу названия (?q=).
+
+    Без учёта регистра сравнивается только первая буква q: «мото»
+    найдёт «Мотоциклы», а «МОТО» — нет. Нужен вход, как и самой форме.
+    """
+    choices = find_groups(request.GET.get('q', ''))
+    return JsonResponse({
+        'results': [{'id': pk, 'title': title} for pk, title in choices],
+    })
+
+
 @login_required
 def post_create(request):
     is_edit = False
@@ -134,11 +243,20 @@ def follow_index(request):
     template = 'posts/follow.html/'
     title = f"Подписки пользователя {request.user.username}"
     post_list = Post.objects.filter(
-        author__following__user=request.user).select_related('group', 'author')
-    page_obj = add_paginator(post_list, request)
+        timeline_entries__user=request.user
+    ).select_related('group', 'author', 'last_comment__author')
+    page_obj = add_paginator(
+        post_list,
+        request,
+        keys=('-timeline_entries__pub_date', '-timeline_entries__id'),
+    )
+    attach_thumbnails(page_obj, 'post')
     context = {
         'title': title,
         'page_obj': page_obj,
+        'feed_cache_key': feed_cache_key(
+            follow_feed(request.user.id), request, page_obj),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
@@ -147,13 +265,11 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        is_you_follow = Follow.objects.filter(
-            user=request.user).filter(author=author).exists()
-        if not is_you_follow:
-            Follow.objects.create(
-                user=request.user,
-                author=author,
-            )
+        try:
+            Follow.objects.get_or_create(user=request.user, author=author)
+        except IntegrityError:
+            # Параллельный запрос успел подписать пользователя раньше.
+            pass
     return redirect('posts:profile', username=author.username)
 
 
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+
+from posts.admin import message_incomplete
+from posts.deletion import BulkDeletion, DeletionIncomplete
+
+User = get_user_model()
+
+
+class ChunkedDeleteUserAdmin(UserAdmin):
+    actions = ('delete_in_chunks',)
+
+    def delete_in_chunks(self, request, queryset):
+        deletion = BulkDeletion(max_chunks=settings.BULK_DELETE_ADMIN_CHUNKS)
+        try:
+            for user in queryset:
+                deletion.delete_user(user)
+        except DeletionIncomplete:
+            message_incomplete(self, request)
+            return
+        self.message_user(
+            request, f'Удалено пользователей: {len(queryset)}.',
+            messages.SUCCESS)
+    delete_in_chunks.short_description = (
+        'Удалить порциями вместе с постами и подписками')
+    delete_in_chunks.allowed_permissions = ('delete',)
+
+
+admin.site.unregister(User)
+admin.site.register(User, ChunkedDeleteUserAdmin)
@@ -31,6 +31,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -102,6 +106,15 @@ USE_TZ = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Отдавать MEDIA_ROOT через core.media.serve; выключите, если файлы
+# раздаёт фронтовой сервер напрямую.
+MEDIA_SERVE = True
+# Префикс internal location nginx (например '/internal-media/'): тогда
+# файл по заголовку X-Accel-Redirect отдаёт nginx, а не Django.
+MEDIA_ACCEL_REDIRECT = None
+# Кеширование файлов с обычными именами; имена по содержимому
+# (core.storage) кешируются навсегда.
+MEDIA_CACHE_MAX_AGE = 60 * 60
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
@@ -123,6 +136,122 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # paginator
 
 POSTS_IN_PAGE = 10
+COMMENTS_IN_PAGE = 50
+GROUP_CHOICES_LIMIT = 20
+# Префиксы групп длиннее отбрасываются; кешируются ответы только для
+# префиксов не длиннее GROUP_CHOICES_CACHED_PREFIX: длинные редко
+# повторяются, а их диапазон в индексе и так узкий.
+GROUP_CHOICES_MAX_PREFIX = 50
+GROUP_CHOICES_CACHED_PREFIX = 3
+
+
+# timeline
+
+TIMELINE_BATCH_SIZE = 500
+
+
+# bulk deletion
+
+BULK_DELETE_CHUNK_SIZE = 500
+# Сколько порций удаляет одно действие админки; остальное — повторным
+# запуском действия или командой bulk_delete.
+BULK_DELETE_ADMIN_CHUNKS = 10
+
+
+# SQL query budgets
+
+# Сколько SQL-запросов может сделать страница, включая запросы сессии и
+# пользователя: столько, сколько она делает в тестах на самом дорогом
+# пути (с картинкой, с заменой картинки), без запаса. Тесты — и
+# manage.py test (core.test_runner), и pytest (conftest.py) — падают,
+# если страница делает хотя бы на один запрос больше.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 7,
+    'posts:follow_index': 3,
+    'posts:post_detail': 5,
+    'posts:search': 3,
+    'posts:group_choices': 4,
+    'posts:post_create': 9,
+    'posts:post_edit': 11,
+    'posts:add_comment': 6,
+    'posts:post_comments': 2,
+    'posts:profile_follow': 11,
+    'posts:profile_unfollow': 9,
+}
+QUERY_BUDGET_STRICT = False
+QUERY_COUNT_HEADERS = DEBUG
+
+TEST_RUNNER = 'core.test_runner.QueryBudgetTestRunner'
+
+# Запросы дольше SLOW_QUERY_THRESHOLD мс попадают в журнал медленных
+# запросов (None — не записывать); хранятся последние SLOW_QUERY_LOG_SIZE.
+SLOW_QUERY_THRESHOLD = 100
+SLOW_QUERY_LOG_SIZE = 1000
+
+
+# N+1 detector
+
+# 'raise' — ошибка при ленивой загрузке связи в цикле шаблона,
+# 'warn' — предупреждение, None — не проверять.
+NPLUSONE_MODE = 'raise' if DEBUG else None
+NPLUSONE_MODELS = ('posts.Post', 'posts.Comment', 'posts.Follow')
+
+
+# Metrics
+
+METRICS_DATABASE = os.path.join(BASE_DIR, 'cache', 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 5
+# REMOTE_ADDR проверяется как есть: за обратным прокси это адрес самого
+# прокси, и список пропустит либо всех, либо никого. В таком случае
+# задайте METRICS_TOKEN и укажите его Prometheus как bearer_token.
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+METRICS_TOKEN = None
+
+
+# Profiler
+
+# Профилируется в среднем один запрос из PROFILER_SAMPLE_RATE (0 —
+# только запросы с токеном из `manage.py profile_report --token`).
+PROFILER_SAMPLE_RATE = 0
+PROFILER_HEADER = 'HTTP_X_PROFILE'
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+PROFILER_DIRECTORY = os.path.join(BASE_DIR, 'profiles')
+PROFILER_MAX_FILES = 500
+
+
+# Post images
+
+# Загруженные картинки уменьшаются до этого размера и пережимаются
+# (posts.images).
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85
+# Сколько пикселей может быть во всех кадрах анимации вместе после
+# уменьшения: столько она занимает в памяти при пересохранении.
+POST_ANIMATION_MAX_PIXELS = 50_000_000
+
+
+# Thumbnails
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+# Наборы миниатюр для srcset ({% resolve_thumbnails posts "post" %}),
+# от меньшей к большей: все они готовятся в фоне сразу после загрузки.
+THUMBNAIL_SRCSET = {
+    'post': {
+        'geometries': ('320x113', '640x226', '960x339'),
+        'options': {'crop': 'center', 'upscale': True},
+        'sizes': '(max-width: 992px) 100vw, 960px',
+    },
+}
+# Форматы для <source type="...">, которые браузер выбирает сам, если
+# поддерживает. Готовятся только те, что умеет сохранять Pillow.
+THUMBNAIL_MODERN_FORMATS = ('WEBP',)
+# Размер пула фоновых потоков. При DEBUG (разработка и тесты) миниатюры
+# готовятся сразу после сохранения, чтобы не оставлять фоновых потоков.
+THUMBNAIL_WORKERS = 0 if DEBUG else 2
 
 
 # CSRF
@@ -134,6 +263,13 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 3
+GROUP_CHOICES_CACHE_TIMEOUT = 60 * 60 * 24